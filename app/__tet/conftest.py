@@ -0,0 +1,111 @@
+import os
+import sys
+import asyncio
+import time
+
+import httpx
+import pymongo
+import pytest
+from dotenv import load_dotenv
+
+# Carrega as variáveis de ambiente do arquivo .env para os testes.
+load_dotenv()
+
+# Torna o pacote `app` importável pelos testes unitários também quando o pytest é chamado
+# diretamente (`pytest app/__tet`), sem `python -m`.
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..")))
+
+# ==============================================================================
+# CONFIGURAÇÕES DOS FIXTURES
+# ==============================================================================
+DOCS_URL = "http://localhost:8000/docs"
+MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+CV_DIR = os.path.join(os.path.dirname(__file__), "recursos")
+# Tempo máximo de espera para que a API e o MongoDB fiquem prontos antes dos testes.
+READINESS_TIMEOUT = 60
+
+
+def pytest_configure(config):
+    """Registra os marcadores usados pelos testes de integração."""
+    config.addinivalue_line("markers", "slow: testes que dependem de chamadas reais à API do Gemini.")
+
+
+# ==============================================================================
+# PRONTIDÃO DOS SERVIÇOS
+# ==============================================================================
+
+async def _aguardar(nome: str, probe, deadline: float):
+    """Executa `probe` repetidamente, com backoff exponencial, até que ele tenha sucesso ou o prazo expire."""
+    start = time.monotonic()
+    attempt = 0
+    while True:
+        try:
+            await probe()
+            print(f"✅ {nome} pronto em {time.monotonic() - start:.1f}s.")
+            return
+        except Exception as e:
+            if time.monotonic() - start >= deadline:
+                raise TimeoutError(f"{nome} não ficou pronto em {deadline}s: {e}") from e
+            await asyncio.sleep(min(0.25 * 2 ** attempt, 5.0))
+            attempt += 1
+
+
+async def aguardar_servicos(deadline: float = READINESS_TIMEOUT):
+    """Aguarda, em paralelo, a API FastAPI responder e o MongoDB aceitar conexões."""
+    async def api_pronta():
+        async with httpx.AsyncClient(timeout=5) as client:
+            response = await client.get(DOCS_URL)
+            response.raise_for_status()
+
+    def ping_mongo():
+        client = pymongo.MongoClient(MONGO_URL, serverSelectionTimeoutMS=1000)
+        try:
+            client.admin.command('ping')
+        finally:
+            client.close()
+
+    async def mongo_pronto():
+        await asyncio.to_thread(ping_mongo)
+
+    await asyncio.gather(
+        _aguardar("FastAPI", api_pronta, deadline),
+        _aguardar("MongoDB", mongo_pronto, deadline),
+    )
+
+
+# ==============================================================================
+# FIXTURES
+# ==============================================================================
+
+@pytest.fixture(scope="session")
+def servicos_prontos():
+    """Garante que a API e o MongoDB estejam respondendo antes dos testes que dependem deles."""
+    try:
+        asyncio.run(aguardar_servicos())
+    except TimeoutError as e:
+        pytest.fail(f"{e}. Verifique se os contêineres Docker estão em execução.")
+
+
+@pytest.fixture(scope="session")
+def gemini_ready():
+    """Pula os testes que dependem do Gemini quando a GEMINI_API_KEY não está configurada."""
+    if not os.getenv("GEMINI_API_KEY"):
+        pytest.skip("GEMINI_API_KEY não configurada; testes que dependem do Gemini foram ignorados.")
+
+
+@pytest.fixture(scope="session")
+def cv_files():
+    """Lista os caminhos dos CVs (.pdf) disponíveis no diretório de recursos."""
+    files = sorted(os.path.join(CV_DIR, f) for f in os.listdir(CV_DIR) if f.endswith(".pdf"))
+    assert files, "Nenhum arquivo de CV (.pdf) encontrado para teste."
+    return files
+
+
+@pytest.fixture(scope="session")
+def cv_payload(cv_files):
+    """Lê cada CV uma única vez; os bytes são reaproveitados por todos os fluxos de teste."""
+    payload = []
+    for cv in cv_files:
+        with open(cv, "rb") as f:
+            payload.append((os.path.basename(cv), f.read()))
+    return payload
@@ -0,0 +1,85 @@
+import pytest
+
+from app import llm
+from app.llm import _match_results
+
+# ==============================================================================
+# ASSOCIAÇÃO DAS RESPOSTAS DO LLM AOS CURRÍCULOS
+# ==============================================================================
+
+def test_match_results_por_numero_com_nomes_duplicados():
+    """Uploads diferentes com o mesmo nome recebem cada um o item do seu número, mesmo fora de ordem."""
+    file_names = ["cv.pdf", "cv.pdf"]
+    results = [
+        {"index": 2, "file_name": "cv.pdf", "name": "Bob"},
+        {"index": 1, "file_name": "cv.pdf", "name": "Alice"},
+    ]
+
+    matched = _match_results(file_names, results)
+
+    assert [item["name"] for item in matched] == ["Alice", "Bob"]
+
+def test_match_results_nao_associa_nome_duplicado_sem_numero():
+    """Sem número, um nome repetido no lote não identifica o currículo e nenhum dos dois recebe o item."""
+    file_names = ["cv.pdf", "cv.pdf"]
+    results = [{"file_name": "cv.pdf", "name": "Bob"}]
+
+    assert _match_results(file_names, results) == [None, None]
+
+def test_match_results_usa_nome_unico_sem_numero():
+    """Sem número, um item é associado pelo nome quando ele é único no lote, mesmo fora de ordem."""
+    file_names = ["a.pdf", "b.pdf"]
+    results = [{"file_name": "b.pdf", "name": "Bia"}, {"file_name": "a.pdf", "name": "Ana"}]
+
+    assert [item["name"] for item in _match_results(file_names, results)] == ["Ana", "Bia"]
+
+def test_match_results_ignora_numero_fora_do_lote():
+    """Um número inexistente no lote é ignorado, e o item recorre ao nome do arquivo."""
+    file_names = ["a.pdf", "b.pdf", "c.pdf"]
+    results = [{"index": 7, "file_name": "b.pdf", "name": "Bia"}]
+
+    assert _match_results(file_names, results) == [None, results[0], None]
+
+def test_match_results_usa_posicao_com_um_item_por_arquivo():
+    """Sem número nem nome reconhecível, a posição é usada quando há um item por arquivo."""
+    file_names = ["cv.pdf", "cv.pdf"]
+    results = [{"name": "Ana"}, {"name": "Bia"}]
+
+    assert [item["name"] for item in _match_results(file_names, results)] == ["Ana", "Bia"]
+
+def test_match_results_nao_usa_posicao_com_itens_faltando():
+    """Com menos itens que arquivos, a posição não é usada, para que um item ausente não desloque os demais."""
+    file_names = ["a.pdf", "b.pdf"]
+    results = [{"name": "Bia"}]
+
+    assert _match_results(file_names, results) == [None, None]
+
+def test_match_results_posicao_nao_reaproveita_item_ja_associado():
+    """Um item já associado pelo número não é atribuído de novo a outro arquivo pela posição."""
+    file_names = ["a.pdf", "b.pdf"]
+    results = [{"index": 2, "name": "Bia"}, {"name": "sem identificação"}]
+
+    matched = _match_results(file_names, results)
+
+    assert matched[0] is None
+    assert matched[1]["name"] == "Bia"
+
+# ==============================================================================
+# VALIDAÇÃO DOS SUMÁRIOS EM LOTE
+# ==============================================================================
+
+@pytest.mark.asyncio
+async def test_summarize_chunk_descarta_apenas_o_item_invalido(monkeypatch):
+    """Um sumário inválido no lote invalida apenas a própria posição, sem perder os demais."""
+    async def resposta_falsa(prompt_parts, **kwargs):
+        return {"results": [
+            {"index": 1, "file_name": "a.pdf", "summary": "Perfil A", "name": "Ana"},
+            {"index": 2, "file_name": "b.pdf", "summary": "Perfil B", "technologies": "Python"},
+        ]}
+
+    monkeypatch.setattr(llm, "_call_gemini_api", resposta_falsa)
+
+    summaries = await llm._summarize_chunk([("a.pdf", "texto A"), ("b.pdf", "texto B")])
+
+    assert summaries[0].name == "Ana"
+    assert summaries[1] is None
@@ -0,0 +1,22 @@
+import pytest
+
+# O módulo de OCR importa o EasyOCR; sem ele instalado, estes testes são ignorados.
+pytest.importorskip("easyocr")
+
+from app.ocr import sniff
+
+# ==============================================================================
+# DETECÇÃO DO TIPO DE ARQUIVO PELA ASSINATURA
+# ==============================================================================
+
+@pytest.mark.parametrize("header, expected", [
+    (b"%PDF-1.7\n%\xe2\xe3", "pdf"),
+    (b"\xff\xd8\xff\xe0\x00\x10JFIF", "jpg"),
+    (b"\x89PNG\r\n\x1a\n\x00\x00", "png"),
+    (b"PK\x03\x04\x14\x00", "unknown"),
+    (b"%PD", "unknown"),
+    (b"", "unknown"),
+])
+def test_sniff_identifica_assinaturas(header, expected):
+    """PDF, JPEG e PNG são reconhecidos pelos bytes iniciais; o resto, inclusive cabeçalhos curtos, é "unknown"."""
+    assert sniff(header) == expected
@@ -0,0 +1,45 @@
+from app.utils import bm25_scores, clean_text
+
+# ==============================================================================
+# LIMPEZA DO TEXTO EXTRAÍDO
+# ==============================================================================
+
+def test_clean_text_preserva_quebras_de_linha():
+    """As quebras de linha entre linhas com conteúdo são mantidas."""
+    assert clean_text("Nome\nCargo\nEmpresa") == "Nome\nCargo\nEmpresa"
+
+def test_clean_text_descarta_linhas_vazias_ou_so_com_espacos():
+    """Linhas vazias ou compostas apenas por espaços e tabulações são removidas."""
+    assert clean_text("Nome\n\n   \n\t\nCargo\n") == "Nome\nCargo"
+
+def test_clean_text_remove_espacos_nas_quebras_e_colapsa_sequencias():
+    """Espaços ao redor das quebras de linha são removidos e as sequências de espaços viram um só."""
+    assert clean_text("  Python   e\t dados  \n  Engenheiro  de   software ") == "Python e dados\nEngenheiro de software"
+
+# ==============================================================================
+# RELEVÂNCIA LEXICAL (BM25)
+# ==============================================================================
+
+def test_bm25_ordena_pelo_documento_mais_relevante():
+    """Entre documentos de mesmo tamanho, o que mais menciona os termos da consulta recebe a maior pontuação."""
+    documents = [
+        "Java Spring Maven Docker",
+        "Python dados pandas Python",
+        "Python Java Spring Maven",
+    ]
+
+    scores = bm25_scores("python dados", documents)
+
+    assert scores[1] > scores[2] > scores[0] == 0.0
+
+def test_bm25_zera_documentos_sem_termos_da_consulta():
+    """Documentos sem nenhum termo da consulta recebem 0.0 (float)."""
+    scores = bm25_scores("kubernetes", ["Desenvolvedor Java", "Analista de dados"])
+
+    assert scores == [0.0, 0.0]
+    assert all(isinstance(score, float) for score in scores)
+
+def test_bm25_consulta_ou_lista_vazias():
+    """Sem termos na consulta, todos os documentos recebem 0.0; sem documentos, a lista é vazia."""
+    assert bm25_scores("  ", ["Python"]) == [0.0]
+    assert bm25_scores("python", []) == []
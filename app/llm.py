@@ -1,55 +1,273 @@
+import asyncio
 import logging
-import json
-from typing import Optional, Tuple, Any
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Any
 
 import httpx
+import orjson
+import tiktoken
+from pydantic import TypeAdapter, ValidationError
 
+from . import llm_cache
 from .settings import settings
-from .models import ResumeSummary
+from .models import QueryMatch, ResumeSummary
 
 logger = logging.getLogger(__name__)
 
+# Validador da lista de sumários, construído uma única vez: cada lote retornado pelo LLM
+# é validado com uma só chamada em vez de um construtor por currículo.
+_SUMMARY_LIST_ADAPTER = TypeAdapter(List[ResumeSummary])
+
+# Versão dos templates de prompt; compõe a chave do cache e deve mudar junto com os prompts.
+PROMPT_VERSION = "v4"
+# Nome do modelo extraído da URL da API, usado para isolar o cache entre modelos.
+GEMINI_MODEL = settings.GEMINI_API_URL.rsplit("/", 1)[-1].split(":", 1)[0]
+
+# Limite de tokens do texto de cada currículo enviado ao prompt. Deixa folga para as
+# instruções e para a resposta dentro da janela de contexto do modelo.
+MAX_RESUME_TOKENS = 4000
+# Limite de caracteres usado apenas quando o tokenizador não está disponível.
+MAX_RESUME_CHARS = 15000
+# Quantidade máxima de currículos por prompt de sumarização.
+SUMMARY_BATCH_SIZE = 4
+# Limites de tokens de saída. A latência de geração cresce com o número de tokens
+# produzidos, então cada tipo de chamada pede apenas o necessário para o seu esquema.
+SUMMARY_MAX_OUTPUT_TOKENS = 512  # Por currículo do lote.
+EVAL_MAX_OUTPUT_TOKENS = 256
+COMBINED_MAX_OUTPUT_TOKENS = SUMMARY_MAX_OUTPUT_TOKENS + EVAL_MAX_OUTPUT_TOKENS
+# Tokens de saída por currículo no ranking em lote e limite de tokens de saída do modelo.
+RANK_MAX_OUTPUT_TOKENS = 256
+MODEL_MAX_OUTPUT_TOKENS = 8192
+# Orçamento de tokens dos currículos em um único prompt de ranking; acima dele, o lote é dividido.
+RANK_MAX_PROMPT_TOKENS = 100_000
+# Tempo máximo de espera pela chamada combinada (avaliação + sumário) de um currículo.
+COMBINED_TIMEOUT = 75.0
+
+# Instruções fixas dos prompts. Elas são enviadas como a primeira parte (`parts`) do
+# conteúdo, separadas do conteúdo variável (currículos e consulta), para que o prefixo
+# seja idêntico byte a byte entre chamadas e aproveite o cache implícito do Gemini.
+SUMMARY_PREAMBLE = """Você é um assistente de recrutamento especializado em analisar currículos.
+Você receberá uma lista numerada de currículos, cada um identificado pelo número e pelo nome do arquivo.
+Analise cada currículo e extraia as seguintes informações:
+1. Nome completo do candidato (name)
+2. Cargo atual ou título profissional (title)
+3. Lista de tecnologias/habilidades técnicas mencionadas (technologies)
+4. Lista das principais experiências profissionais: empresa, cargo, período (experiences)
+5. Lista de formações acadêmicas: instituição, curso, ano (education)
+6. Um resumo textual conciso do perfil profissional (summary)
+
+Inclua exatamente um item em "results" para cada currículo, na mesma ordem em que foram apresentados,
+preenchendo "index" com o número do currículo e "file_name" com o nome do arquivo informado."""
+
+EVAL_PREAMBLE = """Você é um assistente de recrutamento especializado em analisar currículos.
+Você receberá uma consulta/vaga e um currículo. Analise o currículo e determine o quão bem ele se adequa à consulta/vaga.
+
+Preencha "title" com o cargo ou título do candidato, "justification" com uma explicação objetiva, em até
+três frases, sobre por que o currículo é ou não adequado para a vaga, e "score" com uma pontuação de 0.0 a 1.0,
+onde 1.0 representa uma correspondência perfeita."""
+
+COMBINED_PREAMBLE = """Você é um assistente de recrutamento especializado em analisar currículos.
+Você receberá uma consulta/vaga e um currículo. Avalie o quão bem o currículo se adequa à consulta/vaga
+e, na mesma resposta, extraia as informações estruturadas do candidato.
+
+Preencha:
+1. "score" com uma pontuação de 0.0 a 1.0, onde 1.0 representa uma correspondência perfeita
+2. "justification" com uma explicação objetiva, em até três frases, sobre por que o currículo é ou não adequado
+3. "name" com o nome completo do candidato
+4. "title" com o cargo atual ou título profissional
+5. "technologies" com as tecnologias/habilidades técnicas mencionadas
+6. "experiences" com as principais experiências profissionais: empresa, cargo, período
+7. "education" com as formações acadêmicas: instituição, curso, ano
+8. "summary" com um resumo textual conciso do perfil profissional"""
+
+RANK_PREAMBLE = """Você é um assistente de recrutamento especializado em analisar currículos.
+Você receberá uma consulta/vaga e uma lista numerada de currículos, cada um identificado pelo número e pelo nome do arquivo.
+Avalie, de forma independente, o quão bem cada currículo se adequa à consulta/vaga.
+
+Inclua exatamente um item em "results" para cada currículo, na mesma ordem em que foram apresentados, com:
+1. "index" com o número do currículo
+2. "file_name" com o nome do arquivo informado
+3. "score" com uma pontuação de 0.0 a 1.0, onde 1.0 representa uma correspondência perfeita
+4. "justification" com uma explicação objetiva, em até três frases, sobre por que o currículo é ou não adequado
+5. "name" com o nome completo do candidato
+6. "title" com o cargo atual ou título profissional"""
+
+# Esquemas de resposta (structured output) enviados ao Gemini. Eles restringem a geração
+# ao formato esperado, dispensando instruções de formatação no prompt.
+SUMMARY_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "results": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "index": {"type": "INTEGER"},
+                    "file_name": {"type": "STRING"},
+                    "name": {"type": "STRING", "nullable": True},
+                    "title": {"type": "STRING", "nullable": True},
+                    "technologies": {"type": "ARRAY", "items": {"type": "STRING"}},
+                    "experiences": {"type": "ARRAY", "items": {"type": "STRING"}},
+                    "education": {"type": "ARRAY", "items": {"type": "STRING"}},
+                    "summary": {"type": "STRING"},
+                },
+                "required": ["index", "file_name", "summary"],
+            },
+        },
+    },
+    "required": ["results"],
+}
+
+EVAL_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING", "nullable": True},
+        "justification": {"type": "STRING"},
+        "score": {"type": "NUMBER"},
+    },
+    "required": ["justification", "score"],
+}
+
+COMBINED_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "score": {"type": "NUMBER"},
+        "justification": {"type": "STRING"},
+        "name": {"type": "STRING", "nullable": True},
+        "title": {"type": "STRING", "nullable": True},
+        "technologies": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "experiences": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "education": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "summary": {"type": "STRING"},
+    },
+    "required": ["score", "justification", "summary"],
+}
+
+RANK_RESPONSE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "results": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "index": {"type": "INTEGER"},
+                    "file_name": {"type": "STRING"},
+                    "score": {"type": "NUMBER"},
+                    "justification": {"type": "STRING"},
+                    "name": {"type": "STRING", "nullable": True},
+                    "title": {"type": "STRING", "nullable": True},
+                },
+                "required": ["index", "file_name", "score", "justification"],
+            },
+        },
+    },
+    "required": ["results"],
+}
+
+# Inicializa o tokenizador usado no truncamento. O tiktoken não é o tokenizador do Gemini,
+# mas serve como aproximação local e barata. Na primeira vez, o vocabulário é baixado.
+tokenizer = None
+try:
+    tokenizer = tiktoken.get_encoding("cl100k_base")
+except Exception as e:
+    logger.warning(f"Tokenizador indisponível, os currículos serão truncados por caracteres: {e}")
+
+# Limita o número de chamadas simultâneas ao Gemini para respeitar os limites de RPM.
+_gemini_semaphore = asyncio.Semaphore(settings.GEMINI_MAX_CONCURRENCY)
+
+# Cliente HTTP compartilhado entre as chamadas ao Gemini, criado sob demanda.
+_client: Optional[httpx.AsyncClient] = None
 
-async def _call_gemini_api(prompt: str) -> Optional[Any]:
-    """Envia um prompt para a API do Gemini e retorna a resposta."""
+async def get_client() -> httpx.AsyncClient:
+    """
+    Retorna o cliente HTTP compartilhado, criando-o na primeira chamada.
+
+    Reutilizar o mesmo cliente mantém o pool de conexões aberto, evitando um novo
+    handshake TCP/TLS por currículo, e permite multiplexar requisições via HTTP/2.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=90.0,
+        )
+    return _client
+
+
+async def close_client():
+    """Fecha o cliente HTTP compartilhado, se ele tiver sido criado."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+        logger.info("Cliente HTTP da API Gemini fechado.")
+
+
+async def _call_gemini_api(
+    prompt_parts: List[str],
+    max_output_tokens: int = 2048,
+    response_schema: Optional[dict] = None,
+) -> Optional[Any]:
+    """
+    Envia um prompt para a API do Gemini e retorna a resposta.
+
+    Args:
+        prompt_parts: Os trechos do prompt, enviados como partes separadas do mesmo conteúdo.
+        max_output_tokens: Limite de tokens gerados na resposta.
+        response_schema: Esquema JSON que a resposta deve seguir, se houver.
+    """
     if not settings.GEMINI_API_KEY:
         logger.error("GEMINI_API_KEY não configurada.")
         return None
 
     url = f"{settings.GEMINI_API_URL}?key={settings.GEMINI_API_KEY}"
-    headers = {"Content-Type": "application/json"}
+    # Respostas JSON comprimem bem; o httpx descomprime o corpo de forma transparente.
+    headers = {"Content-Type": "application/json", "Accept-Encoding": "gzip"}
+
     payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
+        "contents": [{"parts": [{"text": part} for part in prompt_parts]}],
         "generationConfig": {
             "response_mime_type": "application/json",
             "temperature": 0.2,
-            "max_output_tokens": 2048,
+            "max_output_tokens": max_output_tokens,
         },
     }
+    if response_schema is not None:
+        payload["generationConfig"]["response_schema"] = response_schema
 
+    generated_text = None
     try:
-        async with httpx.AsyncClient(timeout=90.0) as client:
-            logger.debug(f"Enviando prompt para a API do Gemini: {prompt[:200]}...")
+        client = await get_client()
+        logger.debug(f"Enviando prompt para a API do Gemini: {prompt_parts[-1][:200]}...")
+        async with _gemini_semaphore:
             response = await client.post(url, headers=headers, json=payload)
-            response.raise_for_status()
-
-            response_data = response.json()
-            logger.debug(f"Resposta completa da API Gemini: {response_data}")
-
-            # Valida a estrutura da resposta da API para garantir que o conteúdo esperado está presente.
-            if not response_data.get("candidates") or not response_data["candidates"][0].get("content", {}).get("parts"):
-                logger.error("Estrutura de resposta inválida da API Gemini: 'parts' não encontrado.")
-                logger.error(f"Resposta completa: {response_data}")
-                return None
-            
-            generated_text = response_data["candidates"][0]["content"]["parts"][0]["text"]
-            logger.debug(f"Texto bruto da resposta da API Gemini: {generated_text[:200]}...")
-            return json.loads(generated_text)
+        response.raise_for_status()
+
+        # O orjson decodifica os bytes UTF-8 diretamente, sem a conversão intermediária para str.
+        response_data = orjson.loads(response.content)
+        logger.debug(f"Resposta completa da API Gemini: {response_data}")
+
+        # Tokens do prompt atendidos pelo cache implícito do Gemini (ausente quando não há acerto).
+        cached_tokens = response_data.get("usageMetadata", {}).get("cachedContentTokenCount")
+        if cached_tokens:
+            logger.info(f"Cache implícito do Gemini reaproveitou {cached_tokens} tokens do prompt.")
+
+        # Valida a estrutura da resposta da API para garantir que o conteúdo esperado está presente.
+        if not response_data.get("candidates") or not response_data["candidates"][0].get("content", {}).get("parts"):
+            logger.error("Estrutura de resposta inválida da API Gemini: 'parts' não encontrado.")
+            logger.error(f"Resposta completa: {response_data}")
+            return None
+        
+        generated_text = response_data["candidates"][0]["content"]["parts"][0]["text"]
+        logger.debug(f"Texto bruto da resposta da API Gemini: {generated_text[:200]}...")
+        return orjson.loads(generated_text)
 
     except httpx.HTTPStatusError as e:
         logger.error(f"Erro HTTP ao chamar a API Gemini: {e.response.status_code} - {e.response.text}")
         return None
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:
         logger.error(f"Erro ao decodificar JSON da resposta da API Gemini: {e}")
         logger.debug(f"Resposta que causou erro: {generated_text}")
         return None
@@ -58,75 +276,207 @@ async def _call_gemini_api(prompt: str) -> Optional[Any]:
         return None
 
 
-async def summarize_resume(resume_text: str, file_name: str) -> Optional[ResumeSummary]:
-    """
-    Gera um resumo estruturado de um currículo usando a API do Gemini.
+def _count_tokens(text: str) -> int:
+    """Conta (ou, sem tokenizador, estima em ~4 caracteres por token) os tokens de um texto."""
+    if tokenizer is not None:
+        return len(tokenizer.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
 
-    Args:
-        resume_text: O texto extraído do currículo.
-        file_name: O nome do arquivo original para referência.
 
-    Returns:
-        Um objeto ResumeSummary com os dados extraídos ou None em caso de erro.
+def _match_results(file_names: List[str], results: list) -> List[Optional[dict]]:
     """
-    logger.info(f"Iniciando sumarização do currículo: {file_name}")
-
-    if len(resume_text) > 15000:  # Limite de caracteres para o prompt
-        logger.warning(f"Texto do currículo ({len(resume_text)} caracteres) excede o limite. Truncando para 15000 caracteres.")
-        resume_text = resume_text[:15000]
+    Associa cada item retornado pelo LLM ao seu currículo pelo número ("index") usado no prompt.
 
-    prompt = f"""
-    Você é um assistente de recrutamento especializado em analisar currículos.
-    Analise o seguinte currículo e extraia as informações relevantes no formato JSON.
-
-    Currículo:
-    {resume_text}
-
-    Extraia as seguintes informações:
-    1. Nome completo do candidato
-    2. Cargo atual ou título profissional
-    3. Lista de tecnologias/habilidades técnicas mencionadas
-    4. Lista das principais experiências profissionais (empresa, cargo, período)
-    5. Lista de formações acadêmicas (instituição, curso, ano)
-    6. Um resumo textual conciso do perfil profissional.
+    Sem um número válido, o item é associado pelo nome do arquivo, mas apenas quando o nome é
+    único no lote: uploads diferentes com o mesmo nome receberiam o mesmo item. Por último,
+    usa-se a posição, e só quando a resposta tem um item por arquivo; caso contrário, um item
+    ausente deslocaria os seguintes e os atribuiria ao arquivo errado. A posição de um arquivo
+    fica None quando a resposta não traz um item para ele.
+    """
+    name_counts = Counter(file_names)
+    by_index: Dict[int, dict] = {}
+    by_name: Dict[str, dict] = {}
+    for item in results:
+        if not isinstance(item, dict):
+            continue
+        index = item.get("index")
+        if isinstance(index, int) and not isinstance(index, bool) and 1 <= index <= len(file_names):
+            by_index.setdefault(index - 1, item)
+        elif name_counts.get(item.get("file_name")) == 1:
+            by_name.setdefault(item["file_name"], item)
+
+    # Itens já associados por número ou nome não são reaproveitados pela posição.
+    used = {id(item) for item in (*by_index.values(), *by_name.values())}
+    use_position = len(results) == len(file_names)
+    matched: List[Optional[dict]] = []
+    for i, file_name in enumerate(file_names):
+        item = by_index.get(i)
+        if item is None:
+            item = by_name.get(file_name)
+        if item is None and use_position and isinstance(results[i], dict) and id(results[i]) not in used:
+            item = results[i]
+        matched.append(item)
+    return matched
+
+
+def _truncate_resume(resume_text: str) -> str:
+    """Trunca o texto do currículo para o limite de tokens (ou de caracteres, sem tokenizador) do prompt."""
+    if tokenizer is not None:
+        # Cada token tem ao menos um caractere, então textos curtos não precisam ser tokenizados.
+        if len(resume_text) <= MAX_RESUME_TOKENS:
+            return resume_text
+        tokens = tokenizer.encode(resume_text, disallowed_special=())
+        if len(tokens) > MAX_RESUME_TOKENS:
+            logger.warning(f"Texto do currículo ({len(tokens)} tokens) excede o limite. Truncando para {MAX_RESUME_TOKENS} tokens.")
+            resume_text = tokenizer.decode(tokens[:MAX_RESUME_TOKENS])
+        return resume_text
+
+    if len(resume_text) > MAX_RESUME_CHARS:
+        logger.warning(f"Texto do currículo ({len(resume_text)} caracteres) excede o limite. Truncando para {MAX_RESUME_CHARS} caracteres.")
+        resume_text = resume_text[:MAX_RESUME_CHARS]
+    return resume_text
+
+
+def _build_summary_batch_prompt(items: List[Tuple[str, str]]) -> List[str]:
+    """Monta as partes de um único prompt de sumarização contendo uma lista numerada de currículos."""
+    resumes_block = "\n---\n".join(
+        f"Currículo {i} (arquivo: {file_name}):\n{resume_text}"
+        for i, (file_name, resume_text) in enumerate(items, start=1)
+    )
+    return [SUMMARY_PREAMBLE, f"Total de currículos: {len(items)}\n\n{resumes_block}"]
+
+
+async def _summarize_chunk(items: List[Tuple[str, str]]) -> List[Optional[ResumeSummary]]:
+    """
+    Sumariza um lote de currículos com uma única chamada à API do Gemini.
 
-    Retorne APENAS um objeto JSON válido com os seguintes campos. Não inclua nenhum outro texto ou formatação markdown.
-    {{
-        "name": "Nome do Candidato",
-        "title": "Cargo/Título Profissional",
-        "technologies": ["tech1", "tech2", ...],
-        "experiences": ["experiência 1", "experiência 2", ...],
-        "education": ["formação 1", "formação 2", ...],
-        "summary": "Resumo textual do perfil profissional."
-    }}
+    A posição de um currículo fica None quando a resposta não traz um sumário válido para ele.
     """
+    file_names = [file_name for file_name, _ in items]
+    prompt_parts = _build_summary_batch_prompt(items)
+
+    logger.info(f"Enviando lote de {len(items)} currículo(s) ({len(prompt_parts[-1])} caracteres) para sumarização via API Gemini.")
+    result = await _call_gemini_api(
+        prompt_parts,
+        max_output_tokens=SUMMARY_MAX_OUTPUT_TOKENS * len(items),
+        response_schema=SUMMARY_RESPONSE_SCHEMA,
+    )
+
+    results = result.get("results") if isinstance(result, dict) else None
+    if not isinstance(results, list):
+        logger.error(f"Falha ao obter sumários válidos da API para o lote: {file_names}")
+        return [None] * len(items)
+
+    found_positions: List[int] = []
+    found_items: List[dict] = []
+    for i, (file_name, item) in enumerate(zip(file_names, _match_results(file_names, results))):
+        if item is None:
+            logger.error(f"A resposta da API não contém um sumário para {file_name}")
+            continue
+
+        found_positions.append(i)
+        found_items.append({
+            "file_name": file_name,
+            "name": item.get("name"),
+            "title": item.get("title"),
+            "technologies": item.get("technologies", []),
+            "experiences": item.get("experiences", []),
+            "education": item.get("education", []),
+            "summary": item.get("summary", ""),
+        })
 
     try:
-        logger.info(f"Enviando texto de {len(resume_text)} caracteres para sumarização via API Gemini.")
-        result = await _call_gemini_api(prompt)
+        validated: List[Optional[ResumeSummary]] = _SUMMARY_LIST_ADAPTER.validate_python(found_items)
+    except ValidationError:
+        # Um item inválido não deve descartar o lote inteiro: os itens são validados um a um
+        # e apenas a posição do inválido fica None.
+        validated = []
+        for i, item in zip(found_positions, found_items):
+            try:
+                validated.append(ResumeSummary.model_validate(item))
+            except ValidationError as e:
+                logger.error(f"Sumário inválido na resposta da API para {file_names[i]}: {e}")
+                validated.append(None)
+
+    summaries: List[Optional[ResumeSummary]] = [None] * len(items)
+    for i, summary in zip(found_positions, validated):
+        if summary is None:
+            continue
+        logger.info(f"Resumo gerado com sucesso para {summary.file_name}: {summary.name} - {summary.title}")
+        summaries[i] = summary
+
+    return summaries
+
+
+async def summarize_resumes_batch(items: List[Tuple[str, str]]) -> List[Optional[ResumeSummary]]:
+    """
+    Gera resumos estruturados de vários currículos agrupando-os em poucos prompts.
 
-        if not result:
-            logger.error(f"Falha ao obter um sumário válido da API para {file_name}")
-            return ResumeSummary(file_name=file_name, summary="Erro ao analisar resposta da IA: formato inválido.")
+    Os currículos são divididos em lotes de até SUMMARY_BATCH_SIZE itens, de modo que
+    N currículos custem uma requisição por lote em vez de uma por arquivo. Currículos
+    já sumarizados anteriormente são servidos pelo cache sem chamar a API.
 
-        logger.info(f"JSON extraído com sucesso para o currículo {file_name}")
+    Args:
+        items: Lista de tuplas (nome do arquivo, texto extraído do currículo).
 
-        summary = ResumeSummary(
-            file_name=file_name,
-            name=result.get("name"),
-            title=result.get("title"),
-            technologies=result.get("technologies", []),
-            experiences=result.get("experiences", []),
-            education=result.get("education", []),
-            summary=result.get("summary", "")
-        )
+    Returns:
+        Uma lista de ResumeSummary na mesma ordem de `items`; a posição fica None
+        caso o lote correspondente falhe com uma exceção.
+    """
+    logger.info(f"Iniciando sumarização em lote de {len(items)} currículo(s)")
+
+    truncated = [(file_name, _truncate_resume(resume_text)) for file_name, resume_text in items]
+    keys = [llm_cache.make_key("sum", PROMPT_VERSION, GEMINI_MODEL, resume_text) for _, resume_text in truncated]
+    summaries: List[Optional[ResumeSummary]] = [None] * len(truncated)
+
+    # Apenas os currículos ausentes do cache são enviados ao Gemini.
+    pending: List[int] = []
+    cached_values = await llm_cache.get_many(keys)
+    for i, ((file_name, resume_text), cached) in enumerate(zip(truncated, cached_values)):
+        if cached is not None:
+            logger.info(f"Sumário de {file_name} obtido do cache.")
+            # O dicionário em cache veio de `model_dump()` de um objeto já validado, então a
+            # validação do pydantic pode ser dispensada.
+            summaries[i] = ResumeSummary.model_construct(**{**cached, "file_name": file_name})
+        else:
+            pending.append(i)
+
+    # Os lotes são enviados em paralelo; a concorrência é limitada em `_call_gemini_api`.
+    chunks = [pending[start:start + SUMMARY_BATCH_SIZE] for start in range(0, len(pending), SUMMARY_BATCH_SIZE)]
+    chunk_results = await asyncio.gather(
+        *(_summarize_chunk([truncated[i] for i in chunk_indexes]) for chunk_indexes in chunks),
+        return_exceptions=True
+    )
+
+    for chunk_indexes, chunk_summaries in zip(chunks, chunk_results):
+        if isinstance(chunk_summaries, Exception):
+            logger.error(f"Erro ao sumarizar o lote {[truncated[i][0] for i in chunk_indexes]}: {chunk_summaries}", exc_info=chunk_summaries)
+            continue
+
+        for i, summary in zip(chunk_indexes, chunk_summaries):
+            if summary is None:
+                summaries[i] = ResumeSummary(file_name=truncated[i][0], summary="Erro ao analisar resposta da IA: formato inválido.")
+                continue
+            summaries[i] = summary
+            llm_cache.set(keys[i], summary.model_dump())
+
+    return summaries
 
-        logger.info(f"Resumo gerado com sucesso para {file_name}: {summary.name} - {summary.title}")
-        return summary
 
-    except Exception as e:
-        logger.error(f"Erro ao sumarizar o currículo {file_name}: {e}", exc_info=True)
-        return None
+async def summarize_resume(resume_text: str, file_name: str) -> Optional[ResumeSummary]:
+    """
+    Gera um resumo estruturado de um currículo usando a API do Gemini.
+
+    Args:
+        resume_text: O texto extraído do currículo.
+        file_name: O nome do arquivo original para referência.
+
+    Returns:
+        Um objeto ResumeSummary com os dados extraídos ou None em caso de erro.
+    """
+    logger.info(f"Iniciando sumarização do currículo: {file_name}")
+    summaries = await summarize_resumes_batch([(file_name, resume_text)])
+    return summaries[0]
 
 
 async def evaluate_resume(resume_text: str, query: str, file_name: str) -> Tuple[Optional[str], Optional[str], Optional[float]]:
@@ -143,32 +493,23 @@ async def evaluate_resume(resume_text: str, query: str, file_name: str) -> Tuple
     """
     logger.info(f"Avaliando o currículo {file_name} para a consulta: '{query}'")
 
-    if len(resume_text) > 15000:
-        logger.warning(f"Texto do currículo ({len(resume_text)} caracteres) excede o limite. Truncando para 15000 caracteres.")
-        resume_text = resume_text[:15000]
+    resume_text = _truncate_resume(resume_text)
 
-    prompt = f"""
-    Você é um assistente de recrutamento especializado em analisar currículos.
-    Avalie o seguinte currículo em relação à consulta/vaga especificada.
+    cache_key = llm_cache.make_key("eval", PROMPT_VERSION, GEMINI_MODEL, query, resume_text)
+    cached = await llm_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"Avaliação de {file_name} obtida do cache. Pontuação: {cached['score']}")
+        return cached["title"], cached["justification"], cached["score"]
 
-    Consulta: {query}
-
-    Currículo:
-    {resume_text}
-
-    Analise o currículo e determine o quão bem ele se adequa à consulta/vaga.
-
-    Retorne APENAS um objeto JSON válido com o seguinte formato. Não inclua nenhum outro texto ou formatação markdown.
-    {{
-        "title": "Cargo ou título do candidato",
-        "justification": "Explicação detalhada sobre por que o currículo é ou não adequado para a vaga.",
-        "score": X.X  // Pontuação de 0.0 a 1.0, onde 1.0 representa uma correspondência perfeita.
-    }}
-    """
+    prompt_parts = [EVAL_PREAMBLE, f"Consulta: {query}\n\nCurrículo:\n{resume_text}"]
 
     try:
         logger.info(f"Enviando prompt de avaliação com {len(resume_text)} caracteres para a API Gemini.")
-        result = await _call_gemini_api(prompt)
+        result = await _call_gemini_api(
+            prompt_parts,
+            max_output_tokens=EVAL_MAX_OUTPUT_TOKENS,
+            response_schema=EVAL_RESPONSE_SCHEMA,
+        )
 
         if not result or not all(k in result for k in ["justification", "score"]):
             logger.error(f"Falha ao obter uma avaliação válida da API para {file_name}")
@@ -180,12 +521,304 @@ async def evaluate_resume(resume_text: str, query: str, file_name: str) -> Tuple
 
         logger.info(f"Avaliação concluída para {file_name}. Pontuação: {score}")
 
+        evaluation = {
+            "title": result.get("title"),
+            "justification": result.get("justification"),
+            "score": score,
+        }
+        llm_cache.set(cache_key, evaluation)
+
         return (
-            result.get("title"),
-            result.get("justification"),
-            score
+            evaluation["title"],
+            evaluation["justification"],
+            evaluation["score"]
         )
 
     except Exception as e:
         logger.error(f"Erro ao avaliar o currículo {file_name}: {e}", exc_info=True)
-        return None, f"Erro no processamento: {str(e)}", 0.0 
\ No newline at end of file
+        return None, f"Erro no processamento: {str(e)}", 0.0 
+
+
+async def evaluate_many(items: List[Tuple[str, str]], query: str) -> List[Tuple[Optional[str], Optional[str], Optional[float]]]:
+    """
+    Avalia vários currículos contra a mesma consulta, em paralelo.
+
+    Args:
+        items: Lista de tuplas (nome do arquivo, texto extraído do currículo).
+        query: A consulta ou descrição da vaga para avaliação.
+
+    Returns:
+        Uma lista de tuplas (título, justificativa, pontuação) na mesma ordem de `items`.
+    """
+    results = await asyncio.gather(
+        *(evaluate_resume(resume_text=resume_text, query=query, file_name=file_name) for file_name, resume_text in items),
+        return_exceptions=True
+    )
+    return [
+        (None, f"Erro no processamento: {str(result)}", 0.0) if isinstance(result, Exception) else result
+        for result in results
+    ]
+
+
+async def evaluate_and_summarize(
+    resume_text: str, query: str, file_name: str
+) -> Optional[Tuple[Tuple[Optional[str], Optional[str], Optional[float]], ResumeSummary]]:
+    """
+    Avalia um currículo contra a consulta e gera o seu resumo com uma única chamada ao Gemini.
+
+    A avaliação e o sumário são gravados no cache com as mesmas chaves usadas por
+    `evaluate_resume` e `summarize_resumes_batch`, de modo que os dois caminhos se aproveitam.
+
+    Args:
+        resume_text: O texto extraído do currículo.
+        query: A consulta ou descrição da vaga para avaliação.
+        file_name: O nome do arquivo original para referência.
+
+    Returns:
+        Uma tupla ((título, justificativa, pontuação), ResumeSummary), ou None se a
+        resposta da API não puder ser interpretada.
+    """
+    logger.info(f"Avaliando e sumarizando o currículo {file_name} para a consulta: '{query}'")
+
+    resume_text = _truncate_resume(resume_text)
+    eval_key = llm_cache.make_key("eval", PROMPT_VERSION, GEMINI_MODEL, query, resume_text)
+    sum_key = llm_cache.make_key("sum", PROMPT_VERSION, GEMINI_MODEL, resume_text)
+
+    cached_eval, cached_sum = await llm_cache.get_many([eval_key, sum_key])
+    if cached_eval is not None and cached_sum is not None:
+        logger.info(f"Avaliação e sumário de {file_name} obtidos do cache. Pontuação: {cached_eval['score']}")
+        summary = ResumeSummary.model_construct(**{**cached_sum, "file_name": file_name})
+        return (cached_eval["title"], cached_eval["justification"], cached_eval["score"]), summary
+
+    prompt_parts = [COMBINED_PREAMBLE, f"Consulta: {query}\n\nCurrículo:\n{resume_text}"]
+
+    logger.info(f"Enviando prompt combinado com {len(resume_text)} caracteres para a API Gemini.")
+    result = await _call_gemini_api(
+        prompt_parts,
+        max_output_tokens=COMBINED_MAX_OUTPUT_TOKENS,
+        response_schema=COMBINED_RESPONSE_SCHEMA,
+    )
+
+    if not isinstance(result, dict) or not all(k in result for k in ["justification", "score", "summary"]):
+        logger.error(f"Falha ao obter uma avaliação combinada válida da API para {file_name}")
+        return None
+
+    try:
+        # Garante que a pontuação esteja sempre no intervalo de 0.0 a 1.0.
+        score = max(0.0, min(1.0, float(result["score"])))
+        summary = ResumeSummary(
+            file_name=file_name,
+            name=result.get("name"),
+            title=result.get("title"),
+            technologies=result.get("technologies", []),
+            experiences=result.get("experiences", []),
+            education=result.get("education", []),
+            summary=result["summary"]
+        )
+    except (TypeError, ValueError) as e:
+        logger.error(f"Resposta combinada da API com valores inválidos para {file_name}: {e}")
+        return None
+
+    logger.info(f"Avaliação combinada concluída para {file_name}. Pontuação: {score}")
+
+    evaluation = {
+        "title": result.get("title"),
+        "justification": result["justification"],
+        "score": score,
+    }
+    llm_cache.set(eval_key, evaluation)
+    llm_cache.set(sum_key, summary.model_dump())
+
+    return (evaluation["title"], evaluation["justification"], evaluation["score"]), summary
+
+
+async def evaluate_and_summarize_many(
+    items: List[Tuple[str, str]], query: str
+) -> Tuple[List[Tuple[Optional[str], Optional[str], Optional[float]]], List[Optional[ResumeSummary]]]:
+    """
+    Avalia e sumariza vários currículos em paralelo, com uma chamada combinada por currículo.
+
+    Os currículos cuja resposta combinada não pôde ser interpretada recorrem às chamadas
+    separadas de avaliação (`evaluate_many`) e de sumarização em lote (`summarize_resumes_batch`).
+
+    Args:
+        items: Lista de tuplas (nome do arquivo, texto extraído do currículo).
+        query: A consulta ou descrição da vaga para avaliação.
+
+    Returns:
+        Uma tupla (avaliações, sumários), ambas listas na mesma ordem de `items`.
+    """
+    results = await asyncio.gather(
+        *(
+            asyncio.wait_for(
+                evaluate_and_summarize(resume_text=resume_text, query=query, file_name=file_name),
+                timeout=COMBINED_TIMEOUT
+            )
+            for file_name, resume_text in items
+        ),
+        return_exceptions=True
+    )
+
+    evaluations: List[Tuple[Optional[str], Optional[str], Optional[float]]] = []
+    summaries: List[Optional[ResumeSummary]] = []
+    fallback: List[int] = []
+    for i, ((file_name, _), result) in enumerate(zip(items, results)):
+        if isinstance(result, asyncio.TimeoutError):
+            logger.error(f"Timeout na avaliação combinada de {file_name}")
+            evaluations.append((None, "Timeout durante o processamento LLM. O arquivo pode ser muito grande ou complexo.", 0.0))
+            summaries.append(None)
+        elif isinstance(result, Exception):
+            logger.error(f"Erro na avaliação combinada de {file_name}: {result}", exc_info=result)
+            evaluations.append((None, f"Erro no processamento: {str(result)}", 0.0))
+            summaries.append(None)
+        elif result is None:
+            evaluations.append(None)
+            summaries.append(None)
+            fallback.append(i)
+        else:
+            evaluations.append(result[0])
+            summaries.append(result[1])
+
+    if fallback:
+        logger.warning(f"Recorrendo às chamadas separadas para {len(fallback)} currículo(s).")
+        fallback_items = [items[i] for i in fallback]
+        fallback_evaluations, fallback_summaries = await asyncio.gather(
+            evaluate_many(fallback_items, query),
+            summarize_resumes_batch(fallback_items)
+        )
+        for i, evaluation, summary in zip(fallback, fallback_evaluations, fallback_summaries):
+            evaluations[i] = evaluation
+            summaries[i] = summary
+
+    return evaluations, summaries
+
+
+def _chunk_for_ranking(items: List[Tuple[str, str]]) -> List[List[int]]:
+    """
+    Divide os currículos em lotes de ranking que respeitam os limites do modelo.
+
+    Um novo lote só é iniciado quando o orçamento de tokens de entrada (RANK_MAX_PROMPT_TOKENS)
+    ou o limite de tokens de saída do modelo seria ultrapassado.
+    """
+    max_per_chunk = max(1, MODEL_MAX_OUTPUT_TOKENS // RANK_MAX_OUTPUT_TOKENS)
+    chunks: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, (_, resume_text) in enumerate(items):
+        tokens = _count_tokens(resume_text)
+        if current and (current_tokens + tokens > RANK_MAX_PROMPT_TOKENS or len(current) >= max_per_chunk):
+            chunks.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def _rank_chunk(query: str, items: List[Tuple[str, str]]) -> List[Optional[dict]]:
+    """
+    Avalia um lote de currículos contra a consulta com uma única chamada à API do Gemini.
+
+    A posição de um currículo fica None quando a resposta não traz uma avaliação válida para ele.
+    """
+    file_names = [file_name for file_name, _ in items]
+    resumes_block = "\n---\n".join(
+        f"Currículo {i} (arquivo: {file_name}):\n{resume_text}"
+        for i, (file_name, resume_text) in enumerate(items, start=1)
+    )
+    prompt_parts = [RANK_PREAMBLE, f"Consulta: {query}\n\nTotal de currículos: {len(items)}\n\n{resumes_block}"]
+
+    logger.info(f"Enviando lote de {len(items)} currículo(s) ({len(prompt_parts[-1])} caracteres) para ranking via API Gemini.")
+    result = await _call_gemini_api(
+        prompt_parts,
+        max_output_tokens=RANK_MAX_OUTPUT_TOKENS * len(items),
+        response_schema=RANK_RESPONSE_SCHEMA,
+    )
+
+    results = result.get("results") if isinstance(result, dict) else None
+    if not isinstance(results, list):
+        logger.error(f"Falha ao obter um ranking válido da API para o lote: {file_names}")
+        return [None] * len(items)
+
+    rankings: List[Optional[dict]] = []
+    for file_name, item in zip(file_names, _match_results(file_names, results)):
+        try:
+            rankings.append({
+                # Garante que a pontuação esteja sempre no intervalo de 0.0 a 1.0.
+                "score": max(0.0, min(1.0, float(item["score"]))),
+                "justification": str(item["justification"]),
+                "name": item.get("name"),
+                "title": item.get("title"),
+            })
+        except (KeyError, TypeError, ValueError):
+            logger.error(f"A resposta da API não contém uma avaliação válida para {file_name}")
+            rankings.append(None)
+    return rankings
+
+
+async def rank_resumes_batch(query: str, resumes: List[Tuple[str, str]]) -> List[QueryMatch]:
+    """
+    Classifica vários currículos em relação a uma consulta com um único prompt por lote.
+
+    A consulta e as instruções são enviadas uma vez para todos os currículos do lote, em vez
+    de uma vez por currículo. Lotes só são divididos quando excedem os limites de tokens do
+    modelo, e os sub-lotes são enviados em paralelo. Currículos ausentes da resposta são
+    avaliados individualmente por `evaluate_and_summarize_many`.
+
+    Args:
+        query: A consulta ou descrição da vaga para avaliação.
+        resumes: Lista de tuplas (nome do arquivo, texto extraído do currículo).
+
+    Returns:
+        Uma lista de QueryMatch na mesma ordem de `resumes` (ainda não ordenada por pontuação).
+    """
+    logger.info(f"Iniciando ranking em lote de {len(resumes)} currículo(s) para a consulta: '{query}'")
+
+    truncated = [(file_name, _truncate_resume(resume_text)) for file_name, resume_text in resumes]
+    keys = [llm_cache.make_key("rank", PROMPT_VERSION, GEMINI_MODEL, query, resume_text) for _, resume_text in truncated]
+    rankings: List[Optional[dict]] = [None] * len(truncated)
+
+    # Apenas os currículos ausentes do cache são enviados ao Gemini.
+    pending: List[int] = []
+    cached_values = await llm_cache.get_many(keys)
+    for i, ((file_name, resume_text), cached) in enumerate(zip(truncated, cached_values)):
+        if cached is not None:
+            logger.info(f"Ranking de {file_name} obtido do cache. Pontuação: {cached['score']}")
+            rankings[i] = cached
+        else:
+            pending.append(i)
+
+    pending_items = [truncated[i] for i in pending]
+    chunks = [[pending[j] for j in chunk] for chunk in _chunk_for_ranking(pending_items)]
+    chunk_results = await asyncio.gather(
+        *(_rank_chunk(query, [truncated[i] for i in chunk_indexes]) for chunk_indexes in chunks),
+        return_exceptions=True
+    )
+
+    for chunk_indexes, chunk_rankings in zip(chunks, chunk_results):
+        if isinstance(chunk_rankings, Exception):
+            logger.error(f"Erro ao classificar o lote {[truncated[i][0] for i in chunk_indexes]}: {chunk_rankings}", exc_info=chunk_rankings)
+            continue
+        for i, ranking in zip(chunk_indexes, chunk_rankings):
+            if ranking is not None:
+                rankings[i] = ranking
+                llm_cache.set(keys[i], ranking)
+
+    # Currículos sem avaliação no lote recorrem às chamadas individuais.
+    missing = [i for i, ranking in enumerate(rankings) if ranking is None]
+    if missing:
+        logger.warning(f"Recorrendo à avaliação individual para {len(missing)} currículo(s).")
+        evaluations, summaries = await evaluate_and_summarize_many([resumes[i] for i in missing], query)
+        for i, (title, justification, score), summary in zip(missing, evaluations, summaries):
+            rankings[i] = {
+                "score": score if score is not None else 0.0,
+                "justification": justification if justification is not None else "No justification provided.",
+                "name": summary.name if summary else None,
+                "title": summary.title if summary else title,
+            }
+
+    return [
+        QueryMatch(file_name=file_name, **ranking)
+        for (file_name, _), ranking in zip(resumes, rankings)
+    ]
@@ -0,0 +1,89 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, List, Optional, Tuple
+
+from . import storage
+
+logger = logging.getLogger(__name__)
+
+# Tempo de vida padrão das entradas do cache, em segundos. É o mesmo do índice TTL do MongoDB,
+# para que uma resposta não expire em memória enquanto continua válida na camada persistente.
+DEFAULT_TTL = storage.CACHE_TTL_SECONDS
+# Número máximo de entradas mantidas em memória; as usadas há mais tempo são descartadas primeiro.
+MAX_ENTRIES = 10_000
+
+# Coleção do MongoDB usada como segunda camada do cache exato, que sobrevive a reinícios.
+PERSISTENT_COLLECTION = "llm_cache"
+
+# Armazenamento em memória: chave -> (instante de expiração, valor).
+# A ordem do dicionário reflete o uso recente (LRU).
+_entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+
+def make_key(*parts: str) -> str:
+    """
+    Gera uma chave determinística (SHA-256) a partir das partes que identificam a chamada ao LLM.
+
+    As partes devem incluir o modelo e a versão do prompt, para que respostas antigas não
+    sejam reaproveitadas após uma troca de modelo.
+    """
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+
+def _get_local(key: str) -> Optional[Any]:
+    """Retorna o valor da camada em memória, ou None se ausente ou expirado."""
+    entry = _entries.get(key)
+    if entry is None:
+        return None
+
+    expires_at, value = entry
+    if expires_at < time.monotonic():
+        _entries.pop(key, None)
+        return None
+
+    _entries.move_to_end(key)
+    return value
+
+
+async def get_many(keys: List[str]) -> List[Optional[Any]]:
+    """
+    Retorna os valores armazenados para as chaves, na mesma ordem, com None para as ausentes.
+
+    As chaves que não estão em memória são buscadas no MongoDB com uma única consulta.
+    """
+    values = [_get_local(key) for key in keys]
+    missing = list(dict.fromkeys(key for key, value in zip(keys, values) if value is None))
+    if missing:
+        found = await storage.cache_get_many(PERSISTENT_COLLECTION, missing)
+        for key, value in found.items():
+            _store_local(key, value, DEFAULT_TTL)
+        if found:
+            logger.debug(f"Cache persistente do LLM encontrado para {len(found)} chave(s).")
+        values = [found.get(key) if value is None else value for key, value in zip(keys, values)]
+    return values
+
+
+async def get(key: str) -> Optional[Any]:
+    """Retorna o valor armazenado para a chave (em memória ou no MongoDB), ou None se ausente ou expirado."""
+    return (await get_many([key]))[0]
+
+
+def _store_local(key: str, value: Any, ttl: float):
+    """Armazena o valor na camada em memória, descartando a entrada usada há mais tempo se necessário."""
+    if key not in _entries and len(_entries) >= MAX_ENTRIES:
+        _entries.popitem(last=False)
+    _entries[key] = (time.monotonic() + ttl, value)
+    _entries.move_to_end(key)
+
+
+def set(key: str, value: Any, ttl: float = DEFAULT_TTL):
+    """
+    Armazena um valor serializável no cache com o tempo de vida informado.
+
+    O valor fica disponível em memória imediatamente e é gravado no MongoDB, onde expira pelo
+    índice TTL da coleção, em segundo plano, fora do caminho da resposta.
+    """
+    _store_local(key, value, ttl)
+    storage.schedule_cache_set(PERSISTENT_COLLECTION, key, value)
@@ -1,14 +1,13 @@
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, Form, HTTPException, Depends, Request
 from fastapi.responses import JSONResponse, RedirectResponse
-from typing import List, Optional, Any, Dict, Union
+from typing import List, Optional, Any, Dict, Tuple, Union
 import logging
 import uuid
-from datetime import datetime
 from contextlib import asynccontextmanager
 import asyncio
-import json
 
 from . import ocr, llm, storage
+from .utils import bm25_scores, generate_timestamp_ns, timestamp_from_ns
 from .settings import settings
 from .models import (
     ResumeSummary, QueryMatch, LogEntry, 
@@ -27,11 +26,14 @@ async def lifespan(app: FastAPI):
     """
     # Lógica de Startup
     logger.info("Iniciando a aplicação...")
-    storage.connect_to_mongo()
+    await storage.connect_to_mongo()
+    storage.start_log_writer()
     if not settings.GEMINI_API_KEY:
         logger.warning("GEMINI_API_KEY não está configurada. As funcionalidades de IA podem não operar.")
     else:
         logger.info("Chave da API do Gemini configurada com sucesso.")
+    # Com GPU, o leitor OCR é criado aqui, já no processo do worker.
+    await asyncio.to_thread(ocr.init_reader)
     if ocr.reader is None:
         logger.warning("Leitor OCR não inicializado. A extração de texto pode falhar.")
     else:
@@ -41,7 +43,10 @@ async def lifespan(app: FastAPI):
     
     # Lógica de Shutdown
     logger.info("Finalizando a aplicação...")
-    storage.close_mongo_connection()
+    await llm.close_client()
+    # Grava os logs de auditoria pendentes antes de fechar a conexão com o MongoDB.
+    await storage.stop_log_writer()
+    await storage.close_mongo_connection()
 
 app = FastAPI(
     title="IA-Teddy Resume Analyzer",
@@ -50,11 +55,47 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.exception_handler(Exception)
+async def unexpected_error_handler(request: Request, exc: Exception):
+    """Registra erros não tratados e os converte em uma resposta 500 com uma mensagem descritiva."""
+    logger.error(f"Erro inesperado ao processar {request.url.path}: {exc}")
+    return JSONResponse(status_code=500, content={"detail": f"Erro inesperado durante o processamento: {str(exc)}"})
+
 @app.get("/", include_in_schema=False)
 async def root():
     """Redireciona para a documentação da API em /docs."""
     return RedirectResponse(url="/docs")
 
+async def _extract_text(file: UploadFile, request_id: str) -> Tuple[ResumeFile, Optional[str]]:
+    """
+    Lê um arquivo enviado e extrai seu conteúdo textual via OCR.
+
+    Returns:
+        Uma tupla com o ResumeFile resultante e a mensagem de erro para o log de auditoria, se houver.
+    """
+    filename = file.filename
+    content_type = file.content_type
+
+    try:
+        # Extrai texto via OCR. O upload já está em um arquivo temporário (em memória até
+        # um limite e depois em disco), que é lido diretamente, sem copiá-lo para bytes.
+        logger.info(f"[{request_id}] Aplicando OCR ao arquivo: {filename} ({content_type})")
+        text, ocr_error = await ocr.process_file(file.file, filename)
+        if ocr_error:
+            logger.error(f"[{request_id}] Erro OCR para {filename}: {ocr_error}")
+            return ResumeFile(filename=filename, content_type=content_type, text=f"OCR Error: {ocr_error}"), f"{filename}: OCR Error - {ocr_error}"
+
+        if not text:
+            logger.warning(f"[{request_id}] Nenhum texto extraído de {filename}. Pulando processamento LLM para este arquivo.")
+            return ResumeFile(filename=filename, content_type=content_type, text="No text extracted."), f"{filename}: No text extracted after OCR."
+
+        logger.info(f"[{request_id}] Texto extraído com sucesso de {filename}. Tamanho: {len(text)} caracteres")
+        return ResumeFile(filename=filename, content_type=content_type, text=text), None
+
+    except Exception as e:
+        logger.error(f"[{request_id}] Falha ao processar arquivo {filename}: {e}", exc_info=True)
+        return ResumeFile(filename=filename, content_type=content_type, text=f"Processing Error: {str(e)}"), f"{filename}: Processing Error - {str(e)}"
+
 @app.post(
     "/analyze", 
     response_model=Union[SummariesResponse, RankingResponse],
@@ -154,218 +195,169 @@ async def analyze_resumes(
 
     **Auditoria**: Todas as requisições são registradas no banco de dados com `request_id` e `user_id` para rastreamento.
     """
-    try:
-        # Verifica se arquivos foram enviados
-        if not files:
-            raise HTTPException(status_code=400, detail="Nenhum arquivo foi enviado. Por favor, faça upload de pelo menos um currículo.")
-        
-        # Define um request_id se não fornecido
-        if not request_id:
-            request_id = str(uuid.uuid4())
-        
-        # Define um user_id padrão se não fornecido
-        if not user_id:
-            user_id = settings.DEFAULT_USER_ID
-        
-        # Inicializa variáveis para rastreamento
-        start_time = datetime.utcnow()
-        processed_files_info: List[ResumeFile] = []
-        log_file_names: List[str] = []
-        error_messages_for_log: List[str] = []
-        
-        # Log da requisição
-        logger.info(f"[{request_id}] Iniciando processamento: {len(files)} arquivo(s) de usuário {user_id}")
-        if query:
-            logger.info(f"[{request_id}] Query: '{query}'")
-        
-        # Lê os conteúdos dos arquivos
-        file_contents = []
-        for file in files:
-            try:
-                logger.info(f"[{request_id}] Lendo arquivo: {file.filename} ({file.content_type})")
-                content = await file.read()
-                file_contents.append({
-                    "filename": file.filename,
-                    "content_type": file.content_type,
-                    "content": content
-                })
-                log_file_names.append(file.filename)
-            except Exception as e:
-                logger.error(f"[{request_id}] Erro ao ler arquivo {file.filename}: {e}", exc_info=True)
-                raise HTTPException(status_code=400, detail=f"Erro ao ler arquivo {file.filename}: {str(e)}")
-        
-        # Processa cada arquivo enviado
-        logger.info(f"[{request_id}] Iniciando extração de texto via OCR para {len(file_contents)} arquivo(s)")
-        for i, file_data in enumerate(file_contents):
-            filename = file_data["filename"]
-            content_type = file_data["content_type"]
-            contents = file_data["content"]
-            
-            logger.info(f"[{request_id}] Processando arquivo {i+1}/{len(file_contents)}: {filename}")
-            
-            try:
-                # Extrai texto via OCR
-                logger.info(f"[{request_id}] Aplicando OCR ao arquivo: {filename}")
-                text, ocr_error = await ocr.process_file(contents, filename)
-                if ocr_error:
-                    logger.error(f"[{request_id}] Erro OCR para {filename}: {ocr_error}")
-                    processed_files_info.append(ResumeFile(filename=filename, content_type=content_type, text=f"OCR Error: {ocr_error}"))
-                    error_messages_for_log.append(f"{filename}: OCR Error - {ocr_error}")
-                    continue # Skip to next file
-                
-                if not text:
-                    logger.warning(f"[{request_id}] Nenhum texto extraído de {filename}. Pulando processamento LLM para este arquivo.")
-                    processed_files_info.append(ResumeFile(filename=filename, content_type=content_type, text="No text extracted."))
-                    error_messages_for_log.append(f"{filename}: No text extracted after OCR.")
-                    continue
-                
-                logger.info(f"[{request_id}] Texto extraído com sucesso de {filename}. Tamanho: {len(text)} caracteres")
-                processed_files_info.append(ResumeFile(filename=filename, content_type=content_type, text=text))
-                
-            except Exception as e:
-                logger.error(f"[{request_id}] Falha ao processar arquivo {filename}: {e}", exc_info=True)
-                processed_files_info.append(ResumeFile(filename=filename, content_type=content_type, text=f"Processing Error: {str(e)}"))
-                error_messages_for_log.append(f"{filename}: Processing Error - {str(e)}")
-                continue
-        
-        # Filter out files where text extraction failed completely for LLM processing
-        valid_resumes_for_llm = [p_file for p_file in processed_files_info if p_file.text and not p_file.text.startswith("OCR Error:") and not p_file.text.startswith("Processing Error:") and p_file.text != "No text extracted."]
-        
-        if not valid_resumes_for_llm:
-            logger.error(f"[{request_id}] Nenhum texto válido extraído dos arquivos. Não é possível prosseguir com análise LLM.")
-            raise HTTPException(status_code=400, detail="Não foi possível extrair texto de nenhum dos arquivos enviados. Verifique se os formatos são suportados e se os arquivos contêm texto legível.")
-        
-        logger.info(f"[{request_id}] {len(valid_resumes_for_llm)}/{len(file_contents)} arquivo(s) com texto válido para análise LLM")
-        
-        # Processa o texto extraído com o LLM
-        final_result = None
-        
-        if query:
-            # Modo Ranking - Avalia currículos contra a consulta
-            logger.info(f"[{request_id}] Iniciando modo RANKING para {len(valid_resumes_for_llm)} currículos")
-            ranking_results: List[QueryMatch] = []
-            
-            for i, resume_file in enumerate(valid_resumes_for_llm):
-                logger.info(f"[{request_id}] Avaliando currículo {i+1}/{len(valid_resumes_for_llm)}: {resume_file.filename}")
-                
-                if resume_file.text:
-                    # Adiciona timeout para evitar travamento
-                    try:
-                        # Timeout de 60 segundos para a avaliação
-                        logger.info(f"[{request_id}] Avaliando compatibilidade de {resume_file.filename} com a consulta")
-                        _, justification, score = await asyncio.wait_for(
-                            llm.evaluate_resume(
-                                resume_text=resume_file.text, 
-                                query=query, 
-                                file_name=resume_file.filename
-                            ), 
-                            timeout=60.0
-                        )
-                        
-                        # Timeout de 30 segundos para o resumo
-                        logger.info(f"[{request_id}] Extraindo detalhes adicionais do currículo {resume_file.filename}")
-                        summary_for_details = await asyncio.wait_for(
-                            llm.summarize_resume(resume_file.text, resume_file.filename),
-                            timeout=30.0
-                        )
-                        
-                        logger.info(f"[{request_id}] Currículo {resume_file.filename} recebeu score: {score}")
-                        ranking_results.append(QueryMatch(
-                            file_name=resume_file.filename,
-                            score=score if score is not None else 0.0,
-                            justification=justification if justification is not None else "No justification provided.",
-                            name=summary_for_details.name if summary_for_details else None,
-                            title=summary_for_details.title if summary_for_details else None
-                        ))
-                    except asyncio.TimeoutError:
-                        logger.error(f"[{request_id}] Timeout ao processar {resume_file.filename}")
-                        ranking_results.append(QueryMatch(
-                            file_name=resume_file.filename,
-                            score=0.0,
-                            justification="Timeout durante o processamento LLM. O arquivo pode ser muito grande ou complexo.",
-                        ))
-                else:
-                    ranking_results.append(QueryMatch(
-                        file_name=resume_file.filename,
-                        score=0.0,
-                        justification="Ignorado devido à falha na extração de texto via OCR.",
-                    ))
-            
-            # Sort by score, descending
-            ranking_results.sort(key=lambda x: x.score, reverse=True)
-            logger.info(f"[{request_id}] Ranking concluído. Resultados ordenados por pontuação.")
-            
-            response_data = RankingResponse(
-                request_id=request_id,
-                user_id=user_id,
-                query=query,
-                ranking=ranking_results
-            )
-            final_result = ranking_results
-        else:
-            # Modo Sumarização - Gera resumos
-            logger.info(f"[{request_id}] Iniciando modo SUMARIZAÇÃO para {len(valid_resumes_for_llm)} currículos")
-            summaries: List[ResumeSummary] = []
-            
-            for i, resume_file in enumerate(valid_resumes_for_llm):
-                logger.info(f"[{request_id}] Resumindo currículo {i+1}/{len(valid_resumes_for_llm)}: {resume_file.filename}")
-                
-                if resume_file.text:
-                    try:
-                        # Timeout de 30 segundos para resumo
-                        summary = await asyncio.wait_for(
-                            llm.summarize_resume(resume_text=resume_file.text, file_name=resume_file.filename),
-                            timeout=30.0
-                        )
-                        if summary:
-                            logger.info(f"[{request_id}] Resumo gerado com sucesso para {resume_file.filename}")
-                            summaries.append(summary)
-                        else:
-                            logger.warning(f"[{request_id}] Falha ao gerar resumo para {resume_file.filename}")
-                            summaries.append(ResumeSummary(file_name=resume_file.filename, summary="Falha ao gerar resumo. O modelo LLM não retornou resultados."))
-                    except asyncio.TimeoutError:
-                        logger.error(f"[{request_id}] Timeout ao resumir {resume_file.filename}")
-                        summaries.append(ResumeSummary(file_name=resume_file.filename, summary="Timeout durante a geração do resumo. O arquivo pode ser muito grande ou complexo."))
-                else:
-                    summaries.append(ResumeSummary(file_name=resume_file.filename, summary="Ignorado devido à falha na extração de texto via OCR."))
-            
-            logger.info(f"[{request_id}] Sumarização concluída. Gerados {len(summaries)} resumos.")
-            
-            response_data = SummariesResponse(
-                request_id=request_id,
-                user_id=user_id,
-                summaries=summaries
+    # Verifica se arquivos foram enviados
+    if not files:
+        raise HTTPException(status_code=400, detail="Nenhum arquivo foi enviado. Por favor, faça upload de pelo menos um currículo.")
+    
+    # Define um request_id se não fornecido
+    if not request_id:
+        request_id = str(uuid.uuid4())
+    
+    # Define um user_id padrão se não fornecido
+    if not user_id:
+        user_id = settings.DEFAULT_USER_ID
+    
+    # Inicializa variáveis para rastreamento
+    start_ns = generate_timestamp_ns()
+    processed_files_info: List[ResumeFile] = []
+    error_messages_for_log: List[str] = []
+    
+    # Log da requisição
+    logger.info(f"[{request_id}] Iniciando processamento: {len(files)} arquivo(s) de usuário {user_id}")
+    if query:
+        logger.info(f"[{request_id}] Query: '{query}'")
+    
+    # Lê os arquivos e extrai o texto de todos eles em paralelo, preservando a ordem de envio
+    log_file_names = [file.filename for file in files]
+    logger.info(f"[{request_id}] Iniciando leitura e extração de texto via OCR para {len(files)} arquivo(s)")
+    # Cada tarefa trata os próprios erros e devolve a mensagem para o log, de modo que a falha
+    # de um arquivo não interrompe os demais; um cancelamento, por outro lado, alcança todas.
+    async with asyncio.TaskGroup() as tg:
+        extraction_tasks = [tg.create_task(_extract_text(file, request_id)) for file in files]
+    for task in extraction_tasks:
+        resume_file, error_message = task.result()
+        processed_files_info.append(resume_file)
+        if error_message:
+            error_messages_for_log.append(error_message)
+    
+    # Filter out files where text extraction failed completely for LLM processing
+    valid_resumes_for_llm = [p_file for p_file in processed_files_info if p_file.text and not p_file.text.startswith("OCR Error:") and not p_file.text.startswith("Processing Error:") and p_file.text != "No text extracted."]
+    
+    if not valid_resumes_for_llm:
+        logger.error(f"[{request_id}] Nenhum texto válido extraído dos arquivos. Não é possível prosseguir com análise LLM.")
+        raise HTTPException(status_code=400, detail="Não foi possível extrair texto de nenhum dos arquivos enviados. Verifique se os formatos são suportados e se os arquivos contêm texto legível.")
+    
+    logger.info(f"[{request_id}] {len(valid_resumes_for_llm)}/{len(files)} arquivo(s) com texto válido para análise LLM")
+    
+    # Processa o texto extraído com o LLM
+    final_result = None
+    
+    if query:
+        # Modo Ranking - Avalia currículos contra a consulta
+        logger.info(f"[{request_id}] Iniciando modo RANKING para {len(valid_resumes_for_llm)} currículos")
+        batch_items = [(resume_file.filename, resume_file.text) for resume_file in valid_resumes_for_llm]
+
+        # Pré-filtro lexical: apenas os currículos mais relevantes para a consulta seguem para o LLM.
+        # Os demais recebem pontuação 0.0, sem avaliação, e aparecem após os avaliados no ranking.
+        filtered_out: List[QueryMatch] = []
+        top_k = settings.RANK_PREFILTER_TOP_K
+        if 0 < top_k < len(batch_items):
+            lexical_scores = bm25_scores(query, [resume_text for _, resume_text in batch_items])
+            best_lexical = max(lexical_scores) or 1.0
+            # A ordenação é estável, então empates preservam a ordem de envio.
+            order = sorted(range(len(batch_items)), key=lambda i: lexical_scores[i], reverse=True)
+            filtered_out = [
+                QueryMatch(
+                    file_name=batch_items[i][0],
+                    score=0.0,
+                    justification=f"Não avaliado pelo LLM: fora dos {top_k} currículos de maior relevância lexical para a consulta (relevância {lexical_scores[i] / best_lexical:.2f} em relação ao mais relevante).",
+                )
+                for i in order[top_k:]
+            ]
+            batch_items = [batch_items[i] for i in sorted(order[:top_k])]
+            logger.info(f"[{request_id}] Pré-filtro BM25: {len(batch_items)} currículo(s) enviados ao LLM, {len(filtered_out)} descartado(s).")
+
+        try:
+            # Todos os currículos são avaliados contra a consulta em um único prompt (dividido
+            # em sub-lotes apenas quando excede os limites de tokens do modelo).
+            ranking_results: List[QueryMatch] = await asyncio.wait_for(
+                llm.rank_resumes_batch(query, batch_items),
+                timeout=90.0
             )
-            final_result = summaries
+            for match in ranking_results:
+                logger.info(f"[{request_id}] Currículo {match.file_name} recebeu score: {match.score}")
+        except asyncio.TimeoutError:
+            logger.error(f"[{request_id}] Timeout ao avaliar o lote de currículos")
+            ranking_results = [
+                QueryMatch(
+                    file_name=file_name,
+                    score=0.0,
+                    justification="Timeout durante o processamento LLM. O arquivo pode ser muito grande ou complexo.",
+                )
+                for file_name, _ in batch_items
+            ]
+        
+        # Sort by score, descending
+        ranking_results.sort(key=lambda x: x.score, reverse=True)
+        ranking_results.extend(filtered_out)
+        logger.info(f"[{request_id}] Ranking concluído. Resultados ordenados por pontuação.")
         
-        # Log da requisição para auditoria interna
-        logger.info(f"[{request_id}] Salvando log de auditoria")
-        log_entry = LogEntry(
+        response_data = RankingResponse(
             request_id=request_id,
             user_id=user_id,
-            timestamp=start_time,
             query=query,
-            files_processed=log_file_names,
-            result=final_result,
-            error_message="; ".join(error_messages_for_log) if error_messages_for_log else None
+            ranking=ranking_results
         )
-        
+        final_result = ranking_results
+    else:
+        # Modo Sumarização - Gera resumos
+        logger.info(f"[{request_id}] Iniciando modo SUMARIZAÇÃO para {len(valid_resumes_for_llm)} currículos")
+        summaries: List[ResumeSummary] = []
+        batch_items = [(resume_file.filename, resume_file.text) for resume_file in valid_resumes_for_llm]
+        timed_out = False
+
         try:
-            await storage.save_log(log_entry)
-            logger.info(f"[{request_id}] Log salvo com sucesso")
-        except Exception as e:
-            logger.error(f"[{request_id}] Erro ao salvar log: {e}", exc_info=True)
-        
-        logger.info(f"[{request_id}] Processamento concluído em {(datetime.utcnow() - start_time).total_seconds():.2f} segundos")
+            # Os lotes de currículos são enviados ao Gemini em paralelo.
+            batch_summaries = await asyncio.wait_for(
+                llm.summarize_resumes_batch(batch_items),
+                timeout=60.0
+            )
+        except asyncio.TimeoutError:
+            logger.error(f"[{request_id}] Timeout ao resumir o lote de currículos")
+            batch_summaries = [None] * len(batch_items)
+            timed_out = True
+
+        for (file_name, _), summary in zip(batch_items, batch_summaries):
+            if summary:
+                logger.info(f"[{request_id}] Resumo gerado com sucesso para {file_name}")
+                summaries.append(summary)
+            elif timed_out:
+                summaries.append(ResumeSummary(file_name=file_name, summary="Timeout durante a geração do resumo. O arquivo pode ser muito grande ou complexo."))
+            else:
+                logger.warning(f"[{request_id}] Falha ao gerar resumo para {file_name}")
+                summaries.append(ResumeSummary(file_name=file_name, summary="Falha ao gerar resumo. O modelo LLM não retornou resultados."))
         
-        return response_data
+        logger.info(f"[{request_id}] Sumarização concluída. Gerados {len(summaries)} resumos.")
         
-    except HTTPException:
-        # Re-throw HTTP exceptions
-        raise
+        response_data = SummariesResponse(
+            request_id=request_id,
+            user_id=user_id,
+            summaries=summaries
+        )
+        final_result = summaries
+    
+    # Log da requisição para auditoria interna
+    logger.info(f"[{request_id}] Registrando log de auditoria")
+    log_entry = LogEntry(
+        request_id=request_id,
+        user_id=user_id,
+        timestamp=timestamp_from_ns(start_ns),
+        query=query,
+        files_processed=log_file_names,
+        result=final_result,
+        error_message="; ".join(error_messages_for_log) if error_messages_for_log else None
+    )
+    
+    try:
+        # O log é gravado em segundo plano, fora do caminho da resposta.
+        await storage.enqueue_log(log_entry)
+        logger.info(f"[{request_id}] Log enfileirado para gravação")
     except Exception as e:
-        logger.error(f"Erro inesperado: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=f"Erro inesperado durante o processamento: {str(e)}")
+        logger.error(f"[{request_id}] Erro ao salvar log: {e}", exc_info=True)
+    
+    logger.info(f"[{request_id}] Processamento concluído em {(generate_timestamp_ns() - start_ns) / 1e9:.2f} segundos")
+    
+    return response_data
 
 # To run the app (if this file is executed directly):
 # if __name__ == "__main__":
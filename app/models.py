@@ -1,15 +1,19 @@
 from typing import List, Dict, Any, Optional
 from datetime import datetime
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 class ResumeFile(BaseModel):
     """Modelo para armazenar informações de um arquivo de currículo processado."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     filename: str = Field(..., description="Nome do arquivo original.")
     content_type: str = Field(..., description="MIME type do arquivo.")
     text: Optional[str] = Field(None, description="Texto extraído do arquivo via OCR.")
 
 class ResumeSummary(BaseModel):
     """Modelo para o resumo estruturado de um currículo."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     file_name: str = Field(..., description="Nome do arquivo original.")
     summary: str = Field(..., description="Resumo textual do currículo.")
     name: Optional[str] = Field(None, description="Nome do candidato.")
@@ -20,6 +24,8 @@ class ResumeSummary(BaseModel):
 
 class QueryMatch(BaseModel):
     """Modelo para o resultado da avaliação de um currículo em relação a uma consulta."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     file_name: str = Field(..., description="Nome do arquivo original.")
     score: float = Field(..., description="Pontuação de compatibilidade (0.0 a 1.0).")
     justification: str = Field(..., description="Justificativa textual para a pontuação.")
@@ -28,12 +34,16 @@ class QueryMatch(BaseModel):
 
 class SummariesResponse(BaseModel):
     """Modelo para a resposta da API no modo de sumarização (sem consulta)."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     request_id: str = Field(..., description="ID único da requisição.")
     user_id: str = Field(..., description="ID do usuário que fez a requisição.")
     summaries: List[ResumeSummary] = Field(..., description="Lista de resumos dos currículos.")
 
 class RankingResponse(BaseModel):
     """Modelo para a resposta da API no modo de ranking (com consulta)."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     request_id: str = Field(..., description="ID único da requisição.")
     user_id: str = Field(..., description="ID do usuário que fez a requisição.")
     query: str = Field(..., description="Consulta original fornecida pelo usuário.")
@@ -41,6 +51,8 @@ class RankingResponse(BaseModel):
 
 class LogEntry(BaseModel):
     """Modelo para o registro de log de auditoria salvo no MongoDB."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     request_id: str = Field(..., description="ID único da requisição.")
     user_id: str = Field(..., description="ID do usuário que fez a requisição.")
     timestamp: datetime = Field(..., description="Timestamp de quando a requisição foi recebida.")
@@ -51,6 +63,8 @@ class LogEntry(BaseModel):
 
 class AnalyzeRequest(BaseModel):
     """Modelo para os dados do formulário da requisição de análise."""
+    model_config = ConfigDict(frozen=True, extra="ignore")
+
     request_id: Optional[str] = None
     user_id: Optional[str] = None
     query: Optional[str] = None 
\ No newline at end of file
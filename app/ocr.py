@@ -1,8 +1,10 @@
 import io
 import os
 import tempfile
+import hashlib
 import logging
-from typing import Tuple, Optional
+from collections import OrderedDict
+from typing import BinaryIO, List, Tuple, Optional, Union
 import asyncio
 
 # Importa bibliotecas para OCR e processamento de imagens
@@ -13,17 +15,96 @@ from PIL import Image
 
 # Importação do módulo utils para manter compatibilidade
 from .utils import clean_text
+from .settings import settings
+from . import storage
 
 logger = logging.getLogger(__name__)
 
-# Inicializa o leitor EasyOCR. Este processo pode ser lento na primeira vez.
-reader = None
-try:
-    # Adicionado suporte para português e inglês.
-    reader = easyocr.Reader(['pt', 'en'])
-    logger.info("Leitor OCR (EasyOCR) inicializado com sucesso.")
-except Exception as e:
-    logger.error(f"Erro ao inicializar o leitor OCR: {e}", exc_info=True)
+# Tamanho dos blocos lidos do arquivo enviado ao calcular o seu hash.
+READ_CHUNK_SIZE = 64 * 1024
+
+# Limita quantas páginas/imagens passam pelo OCR ao mesmo tempo, em todas as requisições.
+OCR_SEM = asyncio.Semaphore(settings.OCR_CONCURRENCY)
+
+# Páginas de PDF com menos caracteres de texto incorporado do que isso são enviadas ao OCR.
+MIN_PAGE_TEXT_CHARS = 20
+
+# Confiança média e quantidade de caracteres mínimas do OCR de uma página; abaixo disso,
+# a página é renderizada novamente em OCR_DPI_RETRY e o OCR é repetido.
+OCR_MIN_CONFIDENCE = 0.6
+OCR_MIN_PAGE_CHARS = 100
+
+# Número máximo de textos extraídos mantidos no cache do OCR (LRU).
+OCR_CACHE_MAX_ENTRIES = 512
+
+# Cache dos textos extraídos: "tipo do arquivo:SHA-256 do conteúdo" -> texto.
+# Reenvios do mesmo arquivo são respondidos sem repetir a extração nem o OCR. Esta camada
+# em memória é consultada primeiro; a coleção `ocr_cache` do MongoDB, em seguida.
+_ocr_cache: "OrderedDict[str, str]" = OrderedDict()
+
+def _use_gpu() -> bool:
+    """Decide se o EasyOCR usará a GPU: a configuração EASYOCR_GPU prevalece sobre a detecção de CUDA."""
+    if settings.EASYOCR_GPU is not None:
+        return settings.EASYOCR_GPU
+    # A detecção via NVML não inicializa o CUDA, que deixaria de funcionar nos workers
+    # criados por fork a partir deste processo.
+    os.environ.setdefault("PYTORCH_NVML_BASED_CUDA_CHECK", "1")
+    try:
+        import torch  # Dependência do EasyOCR.
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+def _build_reader(use_gpu: bool) -> Optional[easyocr.Reader]:
+    """Cria o leitor EasyOCR, ou retorna None em caso de falha. Este processo pode ser lento na primeira vez."""
+    try:
+        # Adicionado suporte para português e inglês. Em CPU, `quantize` usa os pesos
+        # quantizados (int8) do reconhecedor, reduzindo memória e tempo de inferência.
+        ocr_reader = easyocr.Reader(
+            ['pt', 'en'],
+            gpu=use_gpu,
+            quantize=True,
+            model_storage_directory=settings.EASYOCR_MODEL_DIR,
+            download_enabled=settings.EASYOCR_DOWNLOAD_ENABLED,
+        )
+        logger.info(f"Leitor OCR (EasyOCR) inicializado com sucesso ({'GPU' if use_gpu else 'CPU'}).")
+        return ocr_reader
+    except Exception as e:
+        logger.error(f"Erro ao inicializar o leitor OCR: {e}", exc_info=True)
+        return None
+
+# Em CPU, o leitor é criado na importação do módulo: com o gunicorn em modo `--preload`,
+# isso acontece uma única vez no processo mestre, e os workers criados por fork compartilham
+# os pesos dos modelos (copy-on-write) em vez de carregar uma cópia cada. Um contexto CUDA
+# não sobrevive ao fork, então, com GPU, cada worker cria o seu leitor em `init_reader`.
+_reader_gpu = _use_gpu()
+reader = None if _reader_gpu else _build_reader(use_gpu=False)
+
+def init_reader():
+    """
+    Cria o leitor EasyOCR no processo atual, se ele ainda não existir.
+
+    Chamada na inicialização de cada worker (lifespan), depois do fork: é onde o leitor
+    com GPU é criado.
+    """
+    global reader
+    if reader is None:
+        reader = _build_reader(_reader_gpu)
+
+def sniff(header: bytes) -> str:
+    """
+    Identifica o tipo do arquivo pelos seus bytes iniciais (assinatura), independentemente do nome.
+
+    Returns:
+        "pdf", "jpg", "png" ou "unknown" quando a assinatura não é reconhecida.
+    """
+    if header[:4] == b"%PDF":
+        return "pdf"
+    if header[:3] == b"\xff\xd8\xff":
+        return "jpg"
+    if header[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    return "unknown"
 
 def is_pdf(filename: str) -> bool:
     """Verifica, pela extensão, se o arquivo é um PDF."""
@@ -34,13 +115,38 @@ def is_image(filename: str) -> bool:
     image_extensions = ['.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.gif']
     return any(filename.lower().endswith(ext) for ext in image_extensions)
 
-async def process_file(file_content: bytes, filename: str) -> Tuple[Optional[str], Optional[str]]:
+def _inspect_file(file: BinaryIO) -> Tuple[str, str]:
+    """
+    Identifica o tipo do arquivo pela assinatura e calcula o seu SHA-256 (hexadecimal).
+
+    O arquivo é lido em blocos e devolvido posicionado no início. Como um upload grande pode
+    estar em disco, a função deve ser executada fora do loop de eventos.
+    """
+    file.seek(0)
+    detected = sniff(file.read(8))
+    file.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(READ_CHUNK_SIZE), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return detected, digest.hexdigest()
+
+def _remember(cache_key: str, text: str):
+    """Guarda o texto no cache em memória, descartando a entrada usada há mais tempo se necessário."""
+    _ocr_cache[cache_key] = text
+    _ocr_cache.move_to_end(cache_key)
+    if len(_ocr_cache) > OCR_CACHE_MAX_ENTRIES:
+        _ocr_cache.popitem(last=False)
+
+async def process_file(file: Union[bytes, BinaryIO], filename: str) -> Tuple[Optional[str], Optional[str]]:
     """
     Processa um arquivo (PDF ou imagem) para extrair seu conteúdo textual.
     
     Args:
-        file_content: O conteúdo do arquivo em bytes.
-        filename: O nome do arquivo para determinar o tipo de processamento.
+        file: O arquivo enviado, como objeto de arquivo binário (por exemplo, o arquivo
+            temporário de um UploadFile) ou como bytes.
+        filename: O nome do arquivo, usado nos logs e, quando o conteúdo não tem uma
+            assinatura reconhecida, para determinar o tipo pela extensão.
     
     Returns:
         Uma tupla contendo o texto extraído e uma mensagem de erro (se houver).
@@ -51,66 +157,83 @@ async def process_file(file_content: bytes, filename: str) -> Tuple[Optional[str
     logger.info(f"Iniciando processamento OCR para o arquivo: {filename}")
     
     try:
-        if is_pdf(filename):
+        if isinstance(file, (bytes, bytearray)):
+            file = io.BytesIO(file)
+
+        # A leitura do arquivo roda em uma thread: o UploadFile pode ter sido transferido para o disco.
+        detected, digest = await asyncio.to_thread(_inspect_file, file)
+        # A assinatura do conteúdo tem prioridade sobre a extensão, que só é usada para
+        # formatos sem assinatura reconhecida (por exemplo, BMP e TIFF).
+        if detected == "pdf" or (detected == "unknown" and is_pdf(filename)):
             logger.info(f"Arquivo PDF detectado: {filename}")
-            return await process_pdf(file_content)
-        elif is_image(filename):
+            kind, processor = "pdf", process_pdf
+        elif detected != "unknown" or is_image(filename):
             logger.info(f"Arquivo de imagem detectado: {filename}")
-            return await process_image(file_content)
+            kind, processor = "image", process_image
         else:
             error_msg = f"Formato de arquivo não suportado: {filename}"
             logger.warning(error_msg)
             return None, error_msg
+
+        cache_key = f"{kind}:{digest}"
+        cached_text = _ocr_cache.get(cache_key)
+        if cached_text is not None:
+            _ocr_cache.move_to_end(cache_key)
+            logger.info(f"Texto de {filename} obtido do cache do OCR ({len(cached_text)} caracteres).")
+            return cached_text, None
+
+        cached_text = await storage.cache_get("ocr_cache", cache_key)
+        if cached_text is not None:
+            _remember(cache_key, cached_text)
+            logger.info(f"Texto de {filename} obtido do cache persistente do OCR ({len(cached_text)} caracteres).")
+            return cached_text, None
+
+        text, error = await processor(file)
+        # Apenas extrações bem-sucedidas são guardadas, para que falhas possam ser tentadas de novo.
+        # A gravação no MongoDB ocorre em segundo plano, fora do caminho da resposta.
+        if text and not error:
+            _remember(cache_key, text)
+            storage.schedule_cache_set("ocr_cache", cache_key, text)
+        return text, error
     except Exception as e:
         error_msg = f"Erro no processamento do arquivo {filename}: {str(e)}"
         logger.error(error_msg, exc_info=True)
         return None, error_msg
 
-async def process_pdf(file_content: bytes) -> Tuple[Optional[str], Optional[str]]:
+async def process_pdf(file: BinaryIO) -> Tuple[Optional[str], Optional[str]]:
     """
     Extrai texto de um arquivo PDF, combinando extração direta e OCR.
     
-    Primeiro, tenta extrair o texto incorporado no PDF, que é mais rápido e preciso.
-    Se o texto extraído for insuficiente, o método recorre ao OCR, tratando cada
-    página como uma imagem.
+    Cada página tem primeiro o seu texto incorporado extraído, que é mais rápido e preciso.
+    Apenas as páginas sem texto suficiente que contêm imagens ou desenhos (digitalizadas ou
+    compostas por imagens) são renderizadas e enviadas ao OCR; páginas vazias são ignoradas.
     """
-    all_text = ""
     try:
-        # Utiliza o PyMuPDF para abrir o conteúdo do PDF em memória.
-        doc = fitz.open(stream=file_content, filetype="pdf")
+        # Utiliza o PyMuPDF para abrir o conteúdo do PDF em memória. O PyMuPDF só aceita
+        # bytes como stream, então o conteúdo é carregado apenas neste ponto, em uma thread.
+        doc = fitz.open(stream=await asyncio.to_thread(file.read), filetype="pdf")
         
-        # Tenta a extração de texto direta de todas as páginas.
-        for page in doc:
-            all_text += page.get_text()
-        
-        # Limpa o texto extraído.
-        all_text = clean_text(all_text)
-
-        # Se o texto direto for suficiente, retorna para evitar o OCR, que é mais lento.
-        if len(all_text) > 100:  # Limiar arbitrário para considerar o texto suficiente.
-            logger.info(f"Texto extraído diretamente do PDF ({len(all_text)} caracteres).")
-            return all_text, None
-
-        logger.info(f"Texto incorporado insuficiente ({len(all_text)}). Recorrendo ao OCR...")
-        
-        # Se a extração direta falhou, parte para o OCR página por página.
-        all_text_ocr = ""
+        page_texts: List[Optional[str]] = []
+        ocr_page_numbers: List[int] = []
         for page_num, page in enumerate(doc):
-            logger.info(f"Processando página {page_num + 1}/{len(doc)} com OCR.")
-            
-            # Renderiza a página como uma imagem de alta resolução.
-            pix = page.get_pixmap(dpi=300)
-            img = Image.frombytes("RGB", [pix.width, pix.height], pix.samples)
-            
-            # Converte a imagem para um array numpy, que é o formato esperado pelo EasyOCR.
-            img_np = np.array(img)
-            
-            # Executa o OCR na imagem da página.
-            result = reader.readtext(img_np, detail=0, paragraph=True)
-            all_text_ocr += ' '.join(result)
+            page_text = page.get_text("text")
+            if len(page_text.strip()) >= MIN_PAGE_TEXT_CHARS or not _page_has_graphics(page):
+                # Páginas sem imagens nem desenhos (por exemplo, em branco ou separadoras) não
+                # têm o que ser reconhecido; o pouco texto que tiverem é mantido como está.
+                page_texts.append(page_text)
+            else:
+                page_texts.append(None)
+                ocr_page_numbers.append(page_num)
+
+        if ocr_page_numbers:
+            logger.info(f"{len(ocr_page_numbers)}/{len(doc)} página(s) sem texto incorporado suficiente. Processando com OCR.")
+            # As páginas passam pelo OCR em paralelo; a concorrência é limitada por OCR_SEM.
+            ocr_texts = await asyncio.gather(*(_ocr_page(doc[page_num]) for page_num in ocr_page_numbers))
+            for page_num, page_text in zip(ocr_page_numbers, ocr_texts):
+                page_texts[page_num] = page_text
         
-        full_text = clean_text(all_text_ocr)
-        logger.info(f"OCR do PDF concluído. Total: {len(full_text)} caracteres.")
+        full_text = clean_text("\n".join(page_texts))
+        logger.info(f"Extração do PDF concluída ({len(ocr_page_numbers)}/{len(doc)} página(s) via OCR). Total: {len(full_text)} caracteres.")
         return full_text, None
     
     except Exception as e:
@@ -118,15 +241,77 @@ async def process_pdf(file_content: bytes) -> Tuple[Optional[str], Optional[str]
         logger.error(error_msg, exc_info=True)
         return None, error_msg
 
-async def process_image(file_content: bytes) -> Tuple[Optional[str], Optional[str]]:
+def _page_has_graphics(page: fitz.Page) -> bool:
+    """Verifica se a página contém imagens ou desenhos vetoriais, onde pode haver texto para o OCR."""
+    return bool(page.get_images()) or bool(page.get_drawings())
+
+def _render_page(page: fitz.Page, dpi: int) -> Tuple[fitz.Pixmap, np.ndarray]:
+    """
+    Renderiza uma página do PDF em tons de cinza e a devolve como array numpy.
+
+    O texto de currículos não depende de cor, e o EasyOCR converte a imagem para tons de
+    cinza de qualquer forma; renderizar com um único canal reduz o buffer em 3x.
+
+    Returns:
+        O pixmap e o array. O array é uma visão sobre a memória do pixmap, que não é mantido
+        vivo por ela: quem chama deve guardar a referência ao pixmap enquanto usa o array.
+    """
+    pix = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    # Visão direta sobre o buffer de pixels do PyMuPDF no formato (altura, largura) aceito
+    # pelo EasyOCR, sem as cópias intermediárias via PIL.Image e np.array.
+    return pix, np.frombuffer(pix.samples_mv, dtype=np.uint8).reshape(pix.height, pix.width)
+
+def _read_page_text(img_np: np.ndarray) -> Tuple[str, float]:
+    """Executa o EasyOCR na imagem e retorna o texto reconhecido e a confiança média das caixas."""
+    # Com `paragraph=True` o EasyOCR descarta a confiança, por isso as caixas são lidas individualmente.
+    result = reader.readtext(img_np, detail=1, paragraph=False)
+    if not result:
+        return "", 0.0
+    text = ' '.join(box_text for _, box_text, _ in result)
+    confidence = sum(box_confidence for _, _, box_confidence in result) / len(result)
+    return text, confidence
+
+async def _ocr_page(page: fitz.Page) -> str:
+    """
+    Renderiza uma página do PDF e extrai o seu texto com o EasyOCR.
+
+    A página é processada em OCR_DPI_DEFAULT; se algum texto for reconhecido, mas com baixa
+    confiança ou em pouca quantidade, ela é renderizada novamente em OCR_DPI_RETRY e o melhor
+    resultado é mantido.
+    """
+    async with OCR_SEM:
+        loop = asyncio.get_running_loop()
+
+        # A renderização fica na thread do loop: o PyMuPDF não suporta acesso concorrente
+        # ao mesmo documento a partir de várias threads.
+        # `pix` permanece referenciado até o fim do OCR, pois `img_np` aponta para a memória dele.
+        pix, img_np = _render_page(page, dpi=settings.OCR_DPI_DEFAULT)
+        # O OCR, que domina o tempo de processamento, roda no executor sem bloquear o loop.
+        text, confidence = await loop.run_in_executor(None, _read_page_text, img_np)
+
+        # Sem nenhuma caixa detectada (página sem texto) uma resolução maior não ajuda; a nova
+        # tentativa só ocorre quando há texto, mas com baixa confiança ou em pouca quantidade.
+        if text and (confidence < OCR_MIN_CONFIDENCE or len(text) < OCR_MIN_PAGE_CHARS) and settings.OCR_DPI_RETRY > settings.OCR_DPI_DEFAULT:
+            logger.info(f"OCR da página {page.number + 1} com confiança {confidence:.2f} e {len(text)} caracteres. Repetindo em {settings.OCR_DPI_RETRY} DPI.")
+            pix, img_np = _render_page(page, dpi=settings.OCR_DPI_RETRY)
+            retry_text, retry_confidence = await loop.run_in_executor(None, _read_page_text, img_np)
+            if retry_confidence >= confidence:
+                text = retry_text
+    return text
+
+def _read_image_text(file: BinaryIO) -> List[str]:
+    """Decodifica a imagem diretamente do arquivo, no formato do EasyOCR, e retorna os parágrafos reconhecidos."""
+    img_np = np.array(Image.open(file))
+    return reader.readtext(img_np, detail=0, paragraph=True)
+
+async def process_image(file: BinaryIO) -> Tuple[Optional[str], Optional[str]]:
     """Extrai texto de uma imagem usando EasyOCR."""
     try:
-        # Carrega a imagem a partir dos bytes e a converte para o formato do EasyOCR.
-        img_np = np.array(Image.open(io.BytesIO(file_content)))
-        
-        # Executa o OCR em uma thread separada para não bloquear a thread principal do asyncio.
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, lambda: reader.readtext(img_np, detail=0, paragraph=True))
+        # A leitura e decodificação da imagem e o OCR rodam na mesma chamada ao executor,
+        # para não bloquear a thread principal do asyncio.
+        async with OCR_SEM:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(None, _read_image_text, file)
         
         text = clean_text(' '.join(result))
         logger.info(f"OCR da imagem concluído. Total: {len(text)} caracteres.")
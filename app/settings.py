@@ -1,20 +1,54 @@
 import os
-from dotenv import load_dotenv
-
-# Carrega as variáveis de ambiente de um arquivo .env, se ele existir.
-load_dotenv()
-
-class Settings:
-    GEMINI_API_KEY: str = os.getenv("GEMINI_API_KEY")
-    GEMINI_API_URL: str = os.getenv(
-        "GEMINI_API_URL",
-        "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent"
-    )
-    MONGODB_URL: str = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
-    MONGODB_DB: str = os.getenv("MONGODB_DB", "ia_teddy")
-    
+from functools import lru_cache
+from typing import Optional
+
+from pydantic_settings import BaseSettings, SettingsConfigDict
+
+
+class Settings(BaseSettings):
+    """
+    Configurações da aplicação, lidas das variáveis de ambiente e do arquivo .env, se ele existir.
+
+    Os valores são validados na inicialização e a instância é imutável.
+    """
+    # Variáveis vazias são tratadas como ausentes; variáveis desconhecidas no .env são ignoradas.
+    model_config = SettingsConfigDict(env_file=".env", env_ignore_empty=True, extra="ignore", frozen=True)
+
+    # Opcional: sem ela a aplicação inicia, mas as funcionalidades de IA ficam indisponíveis.
+    GEMINI_API_KEY: Optional[str] = None
+    GEMINI_API_URL: str = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash-latest:generateContent"
+    # Número máximo de chamadas simultâneas à API do Gemini.
+    GEMINI_MAX_CONCURRENCY: int = 8
+    # Número máximo de páginas/imagens processadas pelo OCR simultaneamente.
+    OCR_CONCURRENCY: int = os.cpu_count() or 1
+    # Diretório dos modelos do EasyOCR (padrão da biblioteca se ausente) e se a biblioteca pode
+    # baixá-los. Com os modelos já presentes na imagem, o download pode ser desativado.
+    EASYOCR_MODEL_DIR: Optional[str] = None
+    EASYOCR_DOWNLOAD_ENABLED: bool = True
+    # Resolução usada ao renderizar páginas de PDF para o OCR e a resolução maior usada
+    # para repetir o OCR de páginas com baixa confiança ou pouco texto reconhecido.
+    OCR_DPI_DEFAULT: int = 200
+    OCR_DPI_RETRY: int = 300
+    # Força (true) ou desativa (false) o uso de GPU pelo EasyOCR; se ausente, a GPU é usada quando disponível.
+    EASYOCR_GPU: Optional[bool] = None
+    # No modo ranking, apenas os K currículos com maior relevância lexical (BM25) para a
+    # consulta são avaliados pelo LLM; 0 desativa o pré-filtro.
+    RANK_PREFILTER_TOP_K: int = 10
+    MONGODB_URL: str = "mongodb://localhost:27017"
+    MONGODB_DB: str = "ia_teddy"
+    # Limites do pool de conexões do cliente MongoDB compartilhado.
+    MONGODB_MAX_POOL_SIZE: int = 50
+    MONGODB_MIN_POOL_SIZE: int = 5
+
     # Valores padrão para identificação de auditoria.
     DEFAULT_REQUEST_ID: str = "default-request-id"
     DEFAULT_USER_ID: str = "default-user-id"
 
-settings = Settings() 
\ No newline at end of file
+
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Retorna a instância única das configurações; pode ser usada como dependência do FastAPI."""
+    return Settings()
+
+
+settings = get_settings()
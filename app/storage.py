@@ -1,72 +1,296 @@
+import asyncio
 import logging
-from pymongo import MongoClient
-from datetime import datetime
+import weakref
+from typing import Any, Dict, List, Optional, Set
+from bson import ObjectId
+from pydantic import TypeAdapter
+from pymongo import AsyncMongoClient, InsertOne, WriteConcern
+from pymongo.errors import CollectionInvalid
+from pymongo.asynchronous.database import AsyncDatabase
 from .models import LogEntry
 from .settings import settings
+from .utils import generate_timestamp
 
 logger = logging.getLogger(__name__)
 
-# Variáveis globais para a conexão com o MongoDB.
-mongo_client = None
-db = None
+# Serializador dos logs de auditoria, construído uma única vez: cada log é convertido chamando
+# diretamente o serializador compilado, sem o despacho de model_dump a cada chamada.
+_LOG_ENTRY_ADAPTER = TypeAdapter(LogEntry)
 
-def connect_to_mongo():
+# Clientes do MongoDB por loop de eventos. O cliente assíncrono nativo do PyMongo fica vinculado
+# ao loop em que é usado, por isso cada loop (um por worker, ou os criados pelos testes) recebe o
+# seu próprio cliente, com o seu pool de conexões reaproveitadas; as entradas são descartadas
+# junto com o loop. O banco só é registrado para o loop depois de uma conexão bem-sucedida.
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncMongoClient]" = weakref.WeakKeyDictionary()
+_databases: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncDatabase]" = weakref.WeakKeyDictionary()
+
+# Os logs de auditoria são gravados sem confirmação do servidor (w=0): a escrita não espera a
+# ida e volta até o primário, ao custo de um log poder ser perdido, sem aviso, se o servidor
+# falhar ou rejeitar o documento. Para registros de auditoria apenas anexados, esse é um custo
+# aceitável em troca de não pagar a latência da rede a cada gravação.
+LOGS_COLLECTION = "logs"
+LOGS_WRITE_CONCERN = WriteConcern(w=0)
+# A coleção de logs é criada como capped: as inserções são apenas anexadas a um espaço de
+# tamanho fixo e, ao atingir um dos limites, os logs mais antigos são descartados.
+LOGS_CAPPED_SIZE_BYTES = 1 << 30
+LOGS_CAPPED_MAX_DOCUMENTS = 10_000_000
+
+# Coleções de cache persistente (OCR e respostas do LLM) e o tempo de vida das entradas,
+# aplicado pelo MongoDB por meio de um índice TTL no campo `created_at`.
+CACHE_COLLECTIONS = ("ocr_cache", "llm_cache")
+CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+# Gravações no cache persistente ainda em andamento, disparadas por schedule_cache_set().
+_pending_cache_writes: "Set[asyncio.Task]" = set()
+
+# Fila dos logs de auditoria, gravados em lote por uma tarefa em segundo plano para que a
+# escrita no MongoDB não atrase a resposta das requisições. Um lote é gravado quando atinge
+# LOG_BATCH_SIZE registros ou LOG_FLUSH_INTERVAL segundos após o seu primeiro registro.
+LOG_QUEUE_MAX_SIZE = 5000
+LOG_BATCH_SIZE = 500
+LOG_FLUSH_INTERVAL = 0.05
+_log_queue: Optional[asyncio.Queue] = None
+_log_writer_task: Optional[asyncio.Task] = None
+
+def _get_client() -> AsyncMongoClient:
+    """Retorna o cliente do MongoDB do loop de eventos atual, criando-o se necessário."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = AsyncMongoClient(
+            settings.MONGODB_URL,
+            serverSelectionTimeoutMS=5000,
+            maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+            minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+        )
+    return client
+
+def _current_db() -> Optional[AsyncDatabase]:
+    """Retorna o banco do loop de eventos atual, ou None se ainda não houve conexão bem-sucedida nele."""
+    return _databases.get(asyncio.get_running_loop())
+
+async def connect_to_mongo():
     """Conecta-se ao MongoDB usando as configurações da aplicação."""
-    global mongo_client, db
     try:
-        mongo_client = MongoClient(settings.MONGODB_URL, serverSelectionTimeoutMS=5000)
-        db = mongo_client[settings.MONGODB_DB]
+        client = _get_client()
+        database = client[settings.MONGODB_DB]
         
         # Testa a conexão para garantir que o servidor está acessível.
-        mongo_client.admin.command('ping')
-        logger.info(f"Conexão com o MongoDB estabelecida com sucesso: {settings.MONGODB_DB}")
+        await client.admin.command('ping')
+        _databases[asyncio.get_running_loop()] = database
+        logger.info("Conexão com o MongoDB estabelecida com sucesso: %s", settings.MONGODB_DB)
+        await _ensure_logs_collection(database)
+        await _ensure_cache_indexes(database)
         return True
     except Exception as e:
-        logger.error(f"Não foi possível conectar ao MongoDB: {e}", exc_info=True)
+        logger.error("Não foi possível conectar ao MongoDB: %s", e, exc_info=True)
         return False
 
-def close_mongo_connection():
-    """Fecha a conexão com o MongoDB."""
-    global mongo_client
-    if mongo_client:
-        mongo_client.close()
+async def _ensure_logs_collection(database: AsyncDatabase):
+    """Cria a coleção capped de logs de auditoria, se ainda não existir, e o índice por request_id."""
+    try:
+        await database.create_collection(
+            LOGS_COLLECTION, capped=True, size=LOGS_CAPPED_SIZE_BYTES, max=LOGS_CAPPED_MAX_DOCUMENTS
+        )
+        logger.info("Coleção capped %s criada.", LOGS_COLLECTION)
+    except CollectionInvalid:
+        # A coleção já existe; uma coleção comum criada anteriormente é mantida como está.
+        pass
+    except Exception as e:
+        logger.warning("Não foi possível criar a coleção %s: %s", LOGS_COLLECTION, e)
+    try:
+        await database[LOGS_COLLECTION].create_index("request_id")
+    except Exception as e:
+        logger.warning("Não foi possível criar o índice da coleção %s: %s", LOGS_COLLECTION, e)
+
+async def _ensure_cache_indexes(database: AsyncDatabase):
+    """Cria os índices TTL das coleções de cache, que removem as entradas expiradas automaticamente."""
+    for collection in CACHE_COLLECTIONS:
+        try:
+            await database[collection].create_index("created_at", expireAfterSeconds=CACHE_TTL_SECONDS)
+        except Exception as e:
+            logger.warning("Não foi possível criar o índice TTL da coleção %s: %s", collection, e)
+
+async def close_mongo_connection():
+    """Fecha a conexão com o MongoDB do loop de eventos atual."""
+    loop = asyncio.get_running_loop()
+    _databases.pop(loop, None)
+    client = _clients.pop(loop, None)
+    if client:
+        await client.close()
         logger.info("Conexão com o MongoDB fechada.")
 
-def get_db():
+async def get_db() -> AsyncDatabase:
     """Retorna a instância do banco de dados, estabelecendo a conexão se necessário."""
-    if db is None or mongo_client is None:
-        if not connect_to_mongo():
+    database = _current_db()
+    if database is None:
+        if not await connect_to_mongo():
              raise RuntimeError("Falha crítica ao conectar com o MongoDB.")
-    return db
+        database = _current_db()
+    return database
 
-async def save_log(log_entry: LogEntry):
-    """
-    Salva um registro de log no MongoDB.
+def _log_document(log_entry: LogEntry) -> dict:
+    """Converte o log de auditoria em um documento compatível com o MongoDB."""
+    # O modo JSON do Pydantic serializa datetime (em ISO 8601) e os modelos aninhados em
+    # uma única passagem, no núcleo compilado, sem percorrer o dicionário em Python.
+    # O _id é gerado aqui para que o driver não precise inseri-lo no documento.
+    return {"_id": ObjectId(), **_LOG_ENTRY_ADAPTER.dump_python(log_entry, mode="json")}
 
-    A função é assíncrona para se manter consistente com o restante da API,
-    embora a operação de inserção do PyMongo seja bloqueante.
-    """
-    database = get_db()
+def _logs_collection(database: AsyncDatabase):
+    """Retorna a coleção de logs de auditoria configurada com gravações sem confirmação."""
+    return database.get_collection(LOGS_COLLECTION, write_concern=LOGS_WRITE_CONCERN)
+
+async def save_log(log_entry: LogEntry):
+    """Salva um registro de log no MongoDB sem bloquear o loop de eventos."""
+    database = await get_db()
     
     try:
-        # Converte o objeto Pydantic para um dicionário compatível com o MongoDB.
-        log_dict = log_entry.model_dump()
-        
-        # Garante a serialização de tipos de dados complexos para o formato JSON.
-        if isinstance(log_dict.get('timestamp'), datetime):
-            log_dict['timestamp'] = log_dict['timestamp'].isoformat()
-            
-        if log_dict.get('result') is not None:
-            if isinstance(log_dict['result'], list) and all(hasattr(item, 'model_dump') for item in log_dict['result']):
-                log_dict['result'] = [item.model_dump() for item in log_dict['result']]
+        log_dict = _log_document(log_entry)
         
         # Insere o log na coleção 'logs'.
-        database.logs.insert_one(log_dict)
-        logger.info(f"Log de auditoria salvo com sucesso: {log_entry.request_id}")
+        await _logs_collection(database).insert_one(log_dict)
+        logger.info("Log de auditoria enviado ao MongoDB: %s", log_entry.request_id)
         return True
     except Exception as e:
-        logger.error(f"Erro ao salvar log no MongoDB: {e}", exc_info=True)
+        logger.error("Erro ao salvar log no MongoDB: %s", e, exc_info=True)
         return False
 
 # Example of how to ensure connection is established at startup if needed by main app
-# connect_to_mongo() # This could be called when the FastAPI app starts up. 
\ No newline at end of file
+# connect_to_mongo() # This could be called when the FastAPI app starts up.
+
+async def enqueue_log(log_entry: LogEntry):
+    """
+    Enfileira um log de auditoria para gravação em segundo plano.
+
+    Se a tarefa de gravação não estiver ativa ou a fila estiver cheia, o log é gravado
+    diretamente, o que também limita a memória ocupada pela fila.
+    """
+    if _log_queue is None:
+        await save_log(log_entry)
+        return
+    try:
+        _log_queue.put_nowait(log_entry)
+    except asyncio.QueueFull:
+        logger.warning("Fila de logs de auditoria cheia. Gravando o log diretamente.")
+        await save_log(log_entry)
+
+async def _write_log_batch(batch: List[LogEntry]):
+    """Grava um lote de logs com uma única operação em massa no MongoDB."""
+    try:
+        database = await get_db()
+        # Sem ordem, o servidor processa as inserções em conjunto e uma falha em um documento
+        # não impede a gravação dos demais.
+        await _logs_collection(database).bulk_write(
+            [InsertOne(_log_document(log_entry)) for log_entry in batch], ordered=False
+        )
+        logger.info("%d log(s) de auditoria enviados ao MongoDB.", len(batch))
+    except Exception as e:
+        logger.error("Erro ao salvar lote de %d log(s) no MongoDB: %s", len(batch), e, exc_info=True)
+
+async def _log_writer():
+    """
+    Consome a fila de logs, agrupando em um lote os registros que chegam até LOG_FLUSH_INTERVAL
+    segundos após o primeiro, limitado a LOG_BATCH_SIZE registros.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        log_entry = await _log_queue.get()
+        # None sinaliza o encerramento; é enfileirado depois dos últimos logs pendentes.
+        if log_entry is None:
+            _log_queue.task_done()
+            return
+        batch = [log_entry]
+        stop = False
+        try:
+            async with asyncio.timeout_at(loop.time() + LOG_FLUSH_INTERVAL):
+                while len(batch) < LOG_BATCH_SIZE:
+                    log_entry = await _log_queue.get()
+                    if log_entry is None:
+                        stop = True
+                        break
+                    batch.append(log_entry)
+        except TimeoutError:
+            pass
+        await _write_log_batch(batch)
+        for _ in range(len(batch) + stop):
+            _log_queue.task_done()
+        if stop:
+            return
+
+async def flush_logs():
+    """Aguarda até que todos os logs enfileirados até o momento tenham sido gravados."""
+    if _log_queue is not None:
+        await _log_queue.join()
+
+def start_log_writer():
+    """Cria a fila de logs e inicia a tarefa que os grava em segundo plano."""
+    global _log_queue, _log_writer_task
+    if _log_writer_task is None:
+        _log_queue = asyncio.Queue(maxsize=LOG_QUEUE_MAX_SIZE)
+        _log_writer_task = asyncio.create_task(_log_writer())
+
+async def stop_log_writer():
+    """Grava os logs ainda pendentes na fila e encerra a tarefa de gravação."""
+    global _log_queue, _log_writer_task
+    if _log_writer_task is None:
+        return
+    # Se a fila estiver cheia, aguarda a tarefa de gravação abrir espaço para o sinal de encerramento.
+    await _log_queue.put(None)
+    await _log_writer_task
+    _log_queue = None
+    _log_writer_task = None
+
+async def cache_get(collection: str, key: str) -> Optional[Any]:
+    """
+    Busca um valor no cache persistente.
+
+    O cache é apenas uma otimização: sem conexão com o MongoDB, ou em caso de erro, retorna None
+    em vez de tentar reconectar, para não atrasar o processamento da requisição.
+    """
+    database = _current_db()
+    if database is None:
+        return None
+    try:
+        doc = await database[collection].find_one({"_id": key}, {"value": 1})
+    except Exception as e:
+        logger.warning("Erro ao consultar o cache %s no MongoDB: %s", collection, e)
+        return None
+    return doc["value"] if doc else None
+
+async def cache_get_many(collection: str, keys: List[str]) -> Dict[str, Any]:
+    """
+    Busca vários valores no cache persistente com uma única consulta.
+
+    Returns:
+        Um dicionário chave -> valor apenas com as chaves encontradas; vazio sem conexão com o
+        MongoDB ou em caso de erro, pelos mesmos motivos de cache_get.
+    """
+    database = _current_db()
+    if database is None or not keys:
+        return {}
+    try:
+        cursor = database[collection].find({"_id": {"$in": keys}}, {"value": 1})
+        return {doc["_id"]: doc["value"] async for doc in cursor}
+    except Exception as e:
+        logger.warning("Erro ao consultar o cache %s no MongoDB: %s", collection, e)
+        return {}
+
+async def cache_set(collection: str, key: str, value: Any):
+    """Grava (ou substitui) um valor no cache persistente; erros são apenas registrados."""
+    database = _current_db()
+    if database is None:
+        return
+    try:
+        await database[collection].update_one(
+            {"_id": key},
+            {"$set": {"value": value, "created_at": generate_timestamp()}},
+            upsert=True
+        )
+    except Exception as e:
+        logger.warning("Erro ao gravar no cache %s do MongoDB: %s", collection, e)
+
+def schedule_cache_set(collection: str, key: str, value: Any):
+    """Grava um valor no cache persistente em segundo plano, fora do caminho da resposta."""
+    task = asyncio.create_task(cache_set(collection, key, value))
+    # Mantém a referência até o fim da gravação, para que a tarefa não seja coletada antes.
+    _pending_cache_writes.add(task)
+    task.add_done_callback(_pending_cache_writes.discard)
@@ -1,26 +1,104 @@
 import re
+import math
+import time
+from collections import Counter
 from datetime import datetime, timezone
+from functools import lru_cache
+from typing import List
 from PIL import Image # For potential image utilities
 import io
 
+# Padrão de palavras usado por bm25_scores, compilado uma única vez na importação do módulo.
+_WORD_RE = re.compile(r'\w+')
+
 def clean_text(text: str) -> str:
-    """Limpa o texto extraído, removendo excesso de quebras de linha e espaços."""
-    text = re.sub(r'\n+', '\n', text)  # Replace multiple newlines with a single one
-    text = re.sub(r'\s{2,}', ' ', text)   # Replace multiple spaces with a single one
-    text = text.strip()
-    return text
+    """
+    Limpa o texto extraído, removendo excesso de quebras de linha e espaços.
+
+    Cada linha tem as sequências de espaços reduzidas a um único espaço e as linhas vazias
+    são descartadas. As divisões e junções de str percorrem o texto em C, sem as duas
+    passagens de expressões regulares sobre o texto inteiro.
+    """
+    return '\n'.join(filter(None, (' '.join(line.split()) for line in text.split('\n'))))
+
+def clean_text_batch(texts: List[str]) -> List[str]:
+    """Aplica clean_text a uma lista de textos, preservando a ordem."""
+    return list(map(clean_text, texts))
+
+def bm25_scores(query: str, documents: List[str], k1: float = 1.5, b: float = 0.75) -> List[float]:
+    """
+    Calcula a relevância lexical (Okapi BM25) de cada documento para a consulta.
+
+    Returns:
+        Uma pontuação por documento, na mesma ordem de `documents`; 0.0 quando nenhum
+        termo da consulta aparece no documento.
+    """
+    tokenized = [_WORD_RE.findall(document.lower()) for document in documents]
+    query_terms = set(_WORD_RE.findall(query.lower()))
+    if not tokenized or not query_terms:
+        return [0.0] * len(documents)
+
+    total = len(tokenized)
+    avg_length = (sum(len(tokens) for tokens in tokenized) / total) or 1.0
+    doc_freq = Counter(term for tokens in tokenized for term in set(tokens) & query_terms)
+    idf = {term: math.log((total - freq + 0.5) / (freq + 0.5) + 1.0) for term, freq in doc_freq.items()}
+
+    scores = []
+    for tokens in tokenized:
+        term_freq = Counter(token for token in tokens if token in idf)
+        length_norm = k1 * (1 - b + b * len(tokens) / avg_length)
+        scores.append(sum((
+            idf[term] * freq * (k1 + 1) / (freq + length_norm)
+            for term, freq in term_freq.items()
+        ), 0.0))
+    return scores
 
 def generate_timestamp() -> datetime:
     """Gera um timestamp UTC padronizado."""
     return datetime.now(timezone.utc)
 
+def generate_timestamp_ns() -> int:
+    """
+    Gera um timestamp como inteiro de nanossegundos desde a época Unix.
+
+    É bem mais barato que criar um datetime; use timestamp_from_ns para convertê-lo apenas
+    quando um datetime for de fato necessário.
+    """
+    return time.time_ns()
+
+def timestamp_from_ns(timestamp_ns: int) -> datetime:
+    """Converte um timestamp de generate_timestamp_ns em um datetime UTC (com precisão de microssegundos)."""
+    return datetime.fromtimestamp(timestamp_ns // 1000 / 1_000_000, tz=timezone.utc)
+
 # Example utility - might be expanded or used by ocr.py
-def convert_image_to_bytes(image: Image.Image, format: str = "PNG") -> bytes:
-    """Converte um objeto de imagem (PIL) para bytes."""
+def convert_image_to_buffer(image: Image.Image, format: str = "PNG", compress_level: int = 1) -> io.BytesIO:
+    """
+    Codifica uma imagem (PIL) em um buffer em memória, posicionado no início.
+
+    Consumidores que apenas leem os dados podem usar o buffer diretamente (ou buffer.getbuffer())
+    sem copiar o conteúdo para um novo objeto bytes.
+    """
     img_byte_arr = io.BytesIO()
-    image.save(img_byte_arr, format=format)
-    return img_byte_arr.getvalue()
+    image.save(img_byte_arr, format=format, compress_level=compress_level)
+    img_byte_arr.seek(0)
+    return img_byte_arr
+
+def convert_image_to_bytes(image: Image.Image, format: str = "PNG", compress_level: int = 1) -> bytes:
+    """
+    Converte um objeto de imagem (PIL) para bytes.
+
+    Para a troca de imagens dentro do processo, a taxa de compressão pouco importa, por isso o
+    PNG usa por padrão o nível 1 do zlib, bem mais rápido que o padrão 6 do Pillow; quem grava
+    em disco pode passar compress_level=6. Com format="RAW", retorna os pixels sem codificação.
+    """
+    if format == "RAW":
+        return image.tobytes()
+    # getvalue() devolve o próprio bloco interno do BytesIO, ajustado ao tamanho escrito, sem copiá-lo.
+    return convert_image_to_buffer(image, format, compress_level).getvalue()
 
+@lru_cache(maxsize=1024)
 def get_file_extension(filename: str) -> str:
     """Extrai a extensão de um nome de arquivo."""
-    return filename.split('.')[-1].lower() if '.' in filename else "" 
\ No newline at end of file
+    # rpartition busca o último ponto a partir do fim, sem criar a lista de todos os segmentos.
+    _, sep, ext = filename.rpartition('.')
+    return ext.lower() if sep else ""